@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark of pooled connections and of the batched export against the
+SQLite stand-in, no MySQL server needed.
+
+Usage: ./benchmarks/bench_db_pool.py [rows]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from db_pool import (ConnectionPool, connect_sqlite,  # noqa: E402
+                     create_users_table)
+from filtered_logger import export_users  # noqa: E402
+
+
+def fake_rows(count: int):
+    """Generate users rows in USERS_COLUMNS order."""
+    for i in range(count):
+        yield ("User {}".format(i), "user{}@example.com".format(i),
+               "(555) 000-{:04d}".format(i % 10000), "000-00-0000",
+               "secret{}".format(i), "10.0.{}.{}".format(i // 256, i % 256),
+               "2019-11-14 06:14:24", "Mozilla/5.0")
+
+
+def time_queries(get, put, count: int) -> float:
+    """Return queries/sec of `count` trivial queries on fetched conns."""
+    started = time.perf_counter()
+    for _ in range(count):
+        connection = get()
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        put(connection)
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    """Run the pool and export benchmarks on a temporary database."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "users.db")
+        connection = connect_sqlite(database)
+        create_users_table(connection, fake_rows(rows))
+        connection.close()
+
+        fresh = time_queries(lambda: connect_sqlite(database),
+                             lambda conn: conn.close(), 2000)
+        pool = ConnectionPool(lambda: connect_sqlite(database), size=4)
+        pooled = time_queries(pool.acquire, pool.release, 2000)
+        print("fresh connection: {:>10.0f} queries/s".format(fresh))
+        print("pooled connection:{:>10.0f} queries/s".format(pooled))
+
+        for batch_size in (1, 100, 1000, 10000):
+            with pool.connection() as db:
+                started = time.perf_counter()
+                exported = export_users(db, batch_size, io.StringIO())
+                elapsed = time.perf_counter() - started
+            print("export batch={:<6} {:>10.0f} rows/s".format(
+                batch_size, exported / elapsed))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
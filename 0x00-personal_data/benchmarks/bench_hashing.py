@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Benchmark of batch password hashing against the number of workers.
+
+Usage: ./benchmarks/bench_hashing.py [passwords] [rounds]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from encrypt_password import (hash_passwords,  # noqa: E402
+                              set_target_rounds, validate_passwords)
+
+
+def main() -> None:
+    """Time hash_passwords and validate_passwords per worker count."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    set_target_rounds(int(sys.argv[2]) if len(sys.argv) > 2 else 10)
+    passwords = ["password{}".format(i) for i in range(count)]
+    workers = 1
+    print("{:>8} {:>8} {:>14} {:>14}".format(
+        "workers", "pool", "hashes/s", "checks/s"))
+    while workers <= (os.cpu_count() or 1):
+        for processes in (False, True):
+            started = time.perf_counter()
+            hashes = list(hash_passwords(passwords, workers, processes))
+            hashing = time.perf_counter() - started
+            started = time.perf_counter()
+            assert all(validate_passwords(zip(hashes, passwords), workers,
+                                          processes))
+            checking = time.perf_counter() - started
+            print("{:>8} {:>8} {:>14.1f} {:>14.1f}".format(
+                workers, "process" if processes else "thread",
+                count / hashing, count / checking))
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark of column-aware row redaction against the regex fallback on
+wide users tables.
+
+Usage: ./benchmarks/bench_row_redaction.py [rows]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from filtered_logger import (PII_FIELDS, RedactingFormatter,  # noqa: E402
+                             RowRedactor, _row_template, filter_datum)
+
+
+def make_table(columns: int, rows: int):
+    """
+    Build the column names and rows of a synthetic wide table.
+
+    The PII fields come first, followed by filler columns.
+    """
+    names = list(PII_FIELDS) + ["col_{}".format(i)
+                                for i in range(columns - len(PII_FIELDS))]
+    data = [tuple("value_{}_{}".format(r, c) for c in range(columns))
+            for r in range(rows)]
+    return names, data
+
+
+def bench(columns: int, rows: int) -> dict:
+    """
+    Time both redaction paths over the same rows.
+
+    Returns:
+        dict: Rows per second of each path.
+    """
+    names, data = make_table(columns, rows)
+    template = _row_template(names)
+    redactor = RowRedactor(names)
+    redaction = RedactingFormatter.REDACTION
+    separator = RedactingFormatter.SEPARATOR
+
+    def regex_path():
+        for row in data:
+            filter_datum(PII_FIELDS, redaction, template.format(*row),
+                         separator)
+
+    def column_path():
+        for row in data:
+            redactor.format(row)
+
+    result = {}
+    for label, func in (("regex", regex_path), ("column", column_path)):
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        result[label] = rows / seconds
+    return result
+
+
+def main() -> None:
+    """Run the benchmark for a few table widths."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print("{:>8} {:>14} {:>14} {:>8}".format(
+        "columns", "regex rows/s", "column rows/s", "speedup"))
+    for columns in (8, 32, 128, 512):
+        result = bench(columns, rows)
+        print("{:>8} {:>14.0f} {:>14.0f} {:>7.1f}x".format(
+            columns, result["regex"], result["column"],
+            result["column"] / result["regex"]))
+
+
+if __name__ == "__main__":
+    main()
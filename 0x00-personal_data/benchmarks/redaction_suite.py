@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of the personal-data redaction path.
+
+Covers filter_datum, RedactingFormatter.format, RowRedactor.format and
+the batch formatting of export_users() (the path of
+filtered_logger.main()), over a grid of field counts, message lengths,
+shares of PII fields and separators. Each case reports its ops/sec, the
+number of memory blocks one call leaves allocated and the peak bytes
+it allocates (tracemalloc).
+
+Usage:
+    ./benchmarks/redaction_suite.py [--quick] [--output results.json]
+                                    [--baseline baseline.json]
+                                    [--threshold 0.2]
+
+With --baseline, the run exits with status 1 when a case is slower than
+its baseline by more than the threshold.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from filtered_logger import (EXPORT_BATCH_SIZE, PII_FIELDS,  # noqa: E402
+                             RedactingFormatter, RowRedactor, filter_datum)
+
+
+FIELD_COUNTS = (4, 16, 64)
+VALUE_LENGTHS = (8, 64, 512)
+PII_SHARES = (0.0, 0.5, 1.0)
+SEPARATORS = (";", "|")
+QUICK_GRID = {"fields": (8,), "value_length": (16, 256),
+              "pii_share": (0.5,), "separator": (";",)}
+
+
+def make_row(fields: int, value_length: int, pii_share: float) -> tuple:
+    """
+    Build column names and values of a synthetic users row.
+
+    Returns:
+        tuple: The column names and the matching values.
+    """
+    pii = int(round(fields * pii_share))
+    names = [PII_FIELDS[i % len(PII_FIELDS)] for i in range(pii)]
+    names += ["col{}".format(i) for i in range(fields - pii)]
+    values = ["v" * value_length for _ in names]
+    return names, values
+
+
+def build_cases(fields: int, value_length: int, pii_share: float,
+                separator: str) -> Dict[str, Callable[[], object]]:
+    """
+    Build the benchmarked callables for one point of the grid.
+
+    Returns:
+        Dict[str, Callable[[], object]]: Callables keyed by case name.
+    """
+    names, values = make_row(fields, value_length, pii_share)
+    message = "".join("{}={}{}".format(name, value, separator)
+                      for name, value in zip(names, values))
+    formatter = type("Formatter", (RedactingFormatter,),
+                     {"SEPARATOR": separator})(PII_FIELDS)
+    record = logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                               message, None, None)
+    export_formatter = RedactingFormatter(PII_FIELDS)
+    redactor = RowRedactor(names, PII_FIELDS, export_formatter.REDACTION)
+    row = tuple(values)
+    batch = [row] * EXPORT_BATCH_SIZE
+
+    return {
+        "filter_datum": lambda: filter_datum(
+            PII_FIELDS, RedactingFormatter.REDACTION, message, separator),
+        "formatter_format": lambda: formatter.format(record),
+        "row_redactor": lambda: redactor.format(row),
+        "export_batch": lambda: export_formatter.format_batch(
+            "user_data", map(redactor.format, batch), redact=False),
+    }
+
+
+def measure(func: Callable[[], object]) -> dict:
+    """
+    Measure the throughput and the allocations of one call of a callable.
+
+    `blocks` counts the memory blocks allocated by the call that are
+    still alive when it returns, its result included (the traced block
+    delta between two snapshots, leaving out the blocks of tracemalloc
+    and of this module); blocks allocated and freed within the call only
+    show in `peak_bytes`.
+
+    Returns:
+        dict: `ops_per_sec`, `blocks` and `peak_bytes` of the callable.
+    """
+    func()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=3, number=number))
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    ignored = (tracemalloc.__file__, __file__)
+    blocks = sum(stat.count_diff for stat in
+                 after.compare_to(before, "filename")
+                 if stat.count_diff > 0 and
+                 stat.traceback[0].filename not in ignored)
+    return {"ops_per_sec": number / seconds, "blocks": blocks,
+            "peak_bytes": peak - baseline}
+
+
+def case_key(result: dict) -> str:
+    """Identify a result across runs by its name and parameters."""
+    params = result["params"]
+    return "{}[{}]".format(result["name"], ",".join(
+        "{}={}".format(key, params[key]) for key in sorted(params)))
+
+
+def run(grid: dict) -> List[dict]:
+    """
+    Run every case of the benchmark grid.
+
+    Returns:
+        List[dict]: One result per case and grid point.
+    """
+    results = []
+    keys = ("fields", "value_length", "pii_share", "separator")
+    for point in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, point))
+        for name, func in build_cases(**params).items():
+            result = {"name": name, "params": params}
+            result.update(measure(func))
+            results.append(result)
+            print("{:<72} {:>10.0f} ops/s {:>5} blocks {:>7} B".format(
+                case_key(result), result["ops_per_sec"], result["blocks"],
+                result["peak_bytes"]), file=sys.stderr)
+    return results
+
+
+def regressions(results: List[dict], baseline: List[dict],
+                threshold: float) -> List[str]:
+    """
+    Compare results against a baseline run.
+
+    Returns:
+        List[str]: A description of each case slower than its baseline
+        by more than `threshold` (a fraction).
+    """
+    reference = {case_key(result): result for result in baseline}
+    failures = []
+    for result in results:
+        before = reference.get(case_key(result))
+        if before is None:
+            continue
+        ratio = result["ops_per_sec"] / before["ops_per_sec"]
+        if ratio < 1 - threshold:
+            failures.append("{}: {:.0f} -> {:.0f} ops/s ({:+.0%})".format(
+                case_key(result), before["ops_per_sec"],
+                result["ops_per_sec"], ratio - 1))
+    return failures
+
+
+def main() -> None:
+    """Parse the command line, run the suite and check regressions."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the personal-data redaction path.")
+    parser.add_argument("--quick", action="store_true",
+                        help="run a reduced grid")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="tolerated slowdown (default: %(default)s)")
+    args = parser.parse_args()
+
+    grid = QUICK_GRID if args.quick else {
+        "fields": FIELD_COUNTS, "value_length": VALUE_LENGTHS,
+        "pii_share": PII_SHARES, "separator": SEPARATORS}
+    results = run(grid)
+    report = {"python": platform.python_version(),
+              "machine": platform.machine(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f)["results"],
+                                   args.threshold)
+        for failure in failures:
+            print("REGRESSION " + failure, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Module pooling database connections for the personal data exports.
+
+The pool is configured from the PERSONAL_DATA_DB_* environment variables.
+With PERSONAL_DATA_DB_ENGINE=sqlite, PERSONAL_DATA_DB_NAME is the path of
+a SQLite database standing in for the MySQL server.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+
+POOL_SIZE = 5
+POOL_IDLE_TIMEOUT = 300.0
+USERS_COLUMNS = ("name", "email", "phone", "ssn", "password", "ip",
+                 "last_login", "user_agent")
+_POOL_LOCK = threading.Lock()
+_POOL = {}
+
+
+class SQLiteCursor:
+    """DB-API cursor over SQLite mimicking the MySQL connector cursor."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        """
+        Initialize the SQLiteCursor.
+
+        Args:
+            connection (sqlite3.Connection): The underlying connection.
+        """
+        self._cursor = connection.cursor()
+
+    @property
+    def description(self) -> tuple:
+        """DB-API description of the last query's columns."""
+        return self._cursor.description
+
+    @property
+    def column_names(self) -> Tuple[str, ...]:
+        """Column names of the last query, as on MySQL cursors."""
+        if self._cursor.description is None:
+            return ()
+        return tuple(column[0] for column in self._cursor.description)
+
+    @property
+    def rowcount(self) -> int:
+        """Number of rows modified by the last statement."""
+        return self._cursor.rowcount
+
+    def execute(self, operation: str, params: Iterable = ()) -> None:
+        """
+        Execute a statement written with MySQL `%s` placeholders.
+
+        Args:
+            operation (str): The SQL statement.
+            params (Iterable): Values bound to the placeholders.
+        """
+        self._cursor.execute(operation.replace("%s", "?"), tuple(params))
+
+    def executemany(self, operation: str, seq_params: Iterable) -> None:
+        """
+        Execute a statement once per set of parameters.
+
+        Args:
+            operation (str): The SQL statement.
+            seq_params (Iterable): Values bound on each execution.
+        """
+        self._cursor.executemany(operation.replace("%s", "?"), seq_params)
+
+    def fetchone(self) -> tuple:
+        """Fetch the next row, or None when exhausted."""
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = None) -> List[tuple]:
+        """Fetch up to `size` rows, an empty list when exhausted."""
+        if size is None:
+            return self._cursor.fetchmany()
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self) -> List[tuple]:
+        """Fetch all remaining rows."""
+        return self._cursor.fetchall()
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Iterate over the remaining rows."""
+        return iter(self._cursor)
+
+    def close(self) -> None:
+        """Close the cursor."""
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """DB-API connection over SQLite mimicking the MySQL connector one."""
+
+    def __init__(self, database: str):
+        """
+        Initialize the SQLiteConnection.
+
+        Args:
+            database (str): Path of the SQLite database file.
+        """
+        self.database = database
+        self._connection = sqlite3.connect(database,
+                                           check_same_thread=False)
+
+    def cursor(self, *args, **kwargs) -> SQLiteCursor:
+        """
+        Create a cursor; MySQL options such as `buffered` are ignored.
+        """
+        return SQLiteCursor(self._connection)
+
+    def commit(self) -> None:
+        """Commit the current transaction."""
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        """Roll back the current transaction."""
+        self._connection.rollback()
+
+    def is_connected(self) -> bool:
+        """Check that the connection still answers a trivial query."""
+        try:
+            self._connection.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def close(self) -> None:
+        """Close the connection."""
+        self._connection.close()
+
+
+def connect_sqlite(database: str) -> SQLiteConnection:
+    """
+    Open a SQLite stand-in connection.
+
+    Args:
+        database (str): Path of the SQLite database file.
+
+    Returns:
+        SQLiteConnection: A DB-API compatible connection.
+    """
+    return SQLiteConnection(database)
+
+
+def create_users_table(connection, rows: Iterable[tuple] = ()) -> None:
+    """
+    Create the users table of main.sql and insert rows into it.
+
+    Args:
+        connection: Database connection, typically a SQLite stand-in.
+        rows (Iterable[tuple]): Values in USERS_COLUMNS order.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS users")
+    cursor.execute("CREATE TABLE users ({})".format(", ".join(
+        "{} VARCHAR(512)".format(column) for column in USERS_COLUMNS)))
+    cursor.executemany("INSERT INTO users ({}) VALUES ({})".format(
+        ", ".join(USERS_COLUMNS), ", ".join(["%s"] * len(USERS_COLUMNS))),
+        rows)
+    cursor.close()
+    connection.commit()
+
+
+def is_healthy(connection) -> bool:
+    """
+    Default health check of a pooled connection.
+
+    Args:
+        connection: A MySQL connection or a SQLite stand-in.
+
+    Returns:
+        bool: True if the connection is still usable.
+    """
+    try:
+        return bool(connection.is_connected())
+    except Exception:
+        return False
+
+
+class ConnectionPool:
+    """Bounded pool of reusable database connections."""
+
+    def __init__(self, factory: Callable[[], Any], size: int = POOL_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 health_check: Callable[[Any], bool] = is_healthy):
+        """
+        Initialize the ConnectionPool.
+
+        Args:
+            factory (Callable[[], Any]): Opens a new connection.
+            size (int): Maximum number of open connections.
+            idle_timeout (float): Seconds after which an idle connection
+                is closed instead of reused.
+            health_check (Callable[[Any], bool]): Tells whether an idle
+                connection can be handed out again, None to skip.
+        """
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def _discard(self, connection) -> None:
+        """Close a connection that left the pool for good."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._open -= 1
+            self.stats["discarded"] += 1
+            self._condition.notify()
+
+    def acquire(self, timeout: float = None):
+        """
+        Take a connection from the pool, opening one if there is room.
+
+        Args:
+            timeout (float): Seconds to wait for a free connection, None
+                to wait forever.
+
+        Raises:
+            TimeoutError: If no connection became available in time.
+
+        Returns:
+            A database connection, to give back with release().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._open >= self.size:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError("connection pool exhausted")
+                    self._condition.wait(remaining)
+                if not self._idle:
+                    self._open += 1
+                    break
+                connection, released_at = self._idle.pop()
+            if time.monotonic() - released_at > self.idle_timeout or (
+                    self.health_check is not None and
+                    not self.health_check(connection)):
+                self._discard(connection)
+                continue
+            with self._condition:
+                self.stats["reused"] += 1
+            return connection
+        try:
+            connection = self.factory()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.stats["created"] += 1
+        return connection
+
+    def release(self, connection) -> None:
+        """
+        Give a connection back to the pool.
+
+        The connection is rolled back first, so that no open transaction
+        or unread result reaches its next user; one that cannot be rolled
+        back is closed instead.
+
+        Args:
+            connection: A connection obtained from acquire().
+        """
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Borrow a connection for the duration of a with block.
+
+        Args:
+            timeout (float): Seconds to wait for a free connection.
+
+        Yields:
+            A database connection.
+        """
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except Exception:
+            self._discard(connection)
+            raise
+        self.release(connection)
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+def _mysql_factory() -> Any:
+    """Open a MySQL connection with the PERSONAL_DATA_DB_* settings."""
+    from filtered_logger import get_db
+    return get_db()
+
+
+def _sqlite_factory() -> SQLiteConnection:
+    """Open a SQLite stand-in connection on PERSONAL_DATA_DB_NAME."""
+    return connect_sqlite(os.environ.get("PERSONAL_DATA_DB_NAME",
+                                         "personal_data.db"))
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide pool configured from the environment.
+
+    PERSONAL_DATA_DB_ENGINE selects `mysql` (default) or `sqlite`,
+    PERSONAL_DATA_DB_POOL_SIZE and PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT
+    size the pool.
+
+    Returns:
+        ConnectionPool: The shared connection pool.
+    """
+    with _POOL_LOCK:
+        pool = _POOL.get("pool")
+        if pool is None:
+            engine = os.environ.get("PERSONAL_DATA_DB_ENGINE", "mysql")
+            factory = _sqlite_factory if engine == "sqlite" \
+                else _mysql_factory
+            pool = ConnectionPool(
+                factory,
+                int(os.environ.get("PERSONAL_DATA_DB_POOL_SIZE",
+                                   POOL_SIZE)),
+                float(os.environ.get("PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT",
+                                     POOL_IDLE_TIMEOUT)))
+            _POOL["pool"] = pool
+        return pool
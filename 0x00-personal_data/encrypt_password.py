@@ -1,11 +1,152 @@
 #!/usr/bin/env python3
 """
 Module for hashing and validating passwords using bcrypt.
+
+The bcrypt work factor defaults to bcrypt's own (12 rounds). It can be
+pinned with PASSWORD_HASH_ROUNDS, or calibrated on the host to the
+latency budget in PASSWORD_HASH_TARGET_MS. The variables are read, and
+the calibration run, when the module is imported (see
+configure_rounds).
 """
 
+import os
+import time
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from functools import partial
+from typing import Callable, Iterable, Iterator, Tuple
+
 import bcrypt
 
 
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 10
+MAX_ROUNDS = 18
+_ROUNDS = {}
+
+
+def _time_hash(rounds: int) -> float:
+    """
+    Measure the duration of one bcrypt hash at the given work factor.
+
+    Args:
+        rounds (int): The bcrypt work factor.
+
+    Returns:
+        float: The best of a few timings, in seconds.
+    """
+    salt = bcrypt.gensalt(rounds=rounds)
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > 0.05:
+            break
+    return best
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = MIN_ROUNDS,
+                     max_rounds: int = MAX_ROUNDS) -> int:
+    """
+    Pick the highest work factor whose hash latency fits a budget.
+
+    Each extra round doubles the cost of bcrypt, so the work factor is
+    raised one round at a time while the next one fits the budget.
+
+    Args:
+        target_ms (float): Latency budget of one hash, in milliseconds.
+        min_rounds (int): Work factor never to go under.
+        max_rounds (int): Work factor never to go over.
+
+    Returns:
+        int: The calibrated work factor.
+    """
+    budget = target_ms / 1000
+    rounds = min_rounds
+    elapsed = _time_hash(rounds)
+    while rounds < max_rounds and elapsed * 2 <= budget:
+        rounds += 1
+        elapsed = _time_hash(rounds)
+    if elapsed > budget and rounds > min_rounds:
+        rounds -= 1
+    return rounds
+
+
+def set_target_rounds(rounds: int) -> None:
+    """
+    Set the work factor used for new hashes.
+
+    Args:
+        rounds (int): The bcrypt work factor.
+    """
+    _ROUNDS["target"] = rounds
+
+
+def configure_rounds() -> int:
+    """
+    Set the work factor used for new hashes from the environment.
+
+    It is read from PASSWORD_HASH_ROUNDS, else calibrated against
+    PASSWORD_HASH_TARGET_MS, else bcrypt's default. This runs at import,
+    so the calibration happens at startup and not during the first
+    hash; call it again after changing the variables.
+
+    Returns:
+        int: The bcrypt work factor.
+    """
+    if os.getenv("PASSWORD_HASH_ROUNDS"):
+        rounds = int(os.getenv("PASSWORD_HASH_ROUNDS"))
+    elif os.getenv("PASSWORD_HASH_TARGET_MS"):
+        rounds = calibrate_rounds(
+            float(os.getenv("PASSWORD_HASH_TARGET_MS")))
+    else:
+        rounds = DEFAULT_ROUNDS
+    set_target_rounds(rounds)
+    return rounds
+
+
+def target_rounds() -> int:
+    """
+    Return the work factor used for new hashes.
+
+    Returns:
+        int: The bcrypt work factor.
+    """
+    return _ROUNDS["target"]
+
+
+configure_rounds()
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Read the work factor a bcrypt hash was computed with.
+
+    Args:
+        hashed_password (bytes): A bcrypt hash, e.g. b"$2b$12$...".
+
+    Returns:
+        int: The work factor stored in the hash.
+    """
+    return int(hashed_password.split(b"$")[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Tell whether a hash uses another work factor than the current one.
+
+    Args:
+        hashed_password (bytes): A bcrypt hash.
+
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    return hash_rounds(hashed_password) != target_rounds()
+
+
 def hash_password(password: str) -> bytes:
     """
     Hashes a password using bcrypt.
@@ -16,23 +157,130 @@ def hash_password(password: str) -> bytes:
     Returns:
         bytes: A salted, hashed password.
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(rounds=target_rounds()))
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
+def is_valid(hashed_password: bytes, password: str,
+             on_rehash: Callable[[bytes], None] = None) -> bool:
     """
     Validates a password against a hashed password.
 
     Args:
         hashed_password (bytes): The hashed password to check against.
         password (str): The password to validate.
+        on_rehash (Callable[[bytes], None]): Called with a new hash at
+            the current work factor when the password is valid but the
+            stored hash uses another one, so it can be replaced.
 
     Returns:
         bool: True if the password is valid, False otherwise.
     """
+    valid = bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    if valid and on_rehash is not None and needs_rehash(hashed_password):
+        on_rehash(hash_password(password))
+    return valid
+
+
+def _hash(rounds: int, password: str) -> bytes:
+    """Hash a password at an explicit work factor (pool worker)."""
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(rounds=rounds))
+
+
+def _check(pair: Tuple[bytes, str]) -> bool:
+    """Validate a (hash, password) pair (pool worker)."""
+    hashed_password, password = pair
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
 
 
+def _pool_map(func: Callable, items: Iterable, workers: int = None,
+              processes: bool = False, ordered: bool = True) -> Iterator:
+    """
+    Lazily apply a function to items in a thread or process pool.
+
+    At most two items per worker are in flight, so arbitrarily long
+    iterables are consumed as results are read.
+
+    Args:
+        func (Callable): Picklable function applied to each item.
+        items (Iterable): Items to process.
+        workers (int): Pool size, one per CPU if None.
+        processes (bool): Use processes instead of threads.
+        ordered (bool): Yield results in input order; otherwise yield
+            (index, result) pairs as soon as they complete.
+
+    Yields:
+        The results, or (index, result) pairs when not ordered.
+    """
+    workers = workers or os.cpu_count() or 1
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(workers) as executor:
+        if ordered:
+            pending = deque()
+            for item in items:
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+            return
+        pending = {}
+        for index, item in enumerate(items):
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            pending[executor.submit(func, item)] = index
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def hash_passwords(passwords: Iterable[str], workers: int = None,
+                   processes: bool = False,
+                   ordered: bool = True) -> Iterator[bytes]:
+    """
+    Hash many passwords in parallel.
+
+    bcrypt releases the GIL while hashing, so threads scale with cores;
+    processes are available for builds where it does not.
+
+    Args:
+        passwords (Iterable[str]): The passwords to hash.
+        workers (int): Pool size, one per CPU if None.
+        processes (bool): Use processes instead of threads.
+        ordered (bool): Yield hashes in input order; otherwise yield
+            (index, hash) pairs as they complete.
+
+    Yields:
+        bytes: Salted, hashed passwords.
+    """
+    return _pool_map(partial(_hash, target_rounds()), passwords, workers,
+                     processes, ordered)
+
+
+def validate_passwords(pairs: Iterable[Tuple[bytes, str]],
+                       workers: int = None, processes: bool = False,
+                       ordered: bool = True) -> Iterator[bool]:
+    """
+    Validate many (hashed password, password) pairs in parallel.
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): Hashes and the passwords to
+            check against them.
+        workers (int): Pool size, one per CPU if None.
+        processes (bool): Use processes instead of threads.
+        ordered (bool): Yield results in input order; otherwise yield
+            (index, result) pairs as they complete.
+
+    Yields:
+        bool: True for each valid pair, False otherwise.
+    """
+    return _pool_map(_check, pairs, workers, processes, ordered)
+
+
 if __name__ == "__main__":
     password = "MyAmazingPassw0rd"
     encrypted_password = hash_password(password)
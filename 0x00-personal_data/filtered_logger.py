@@ -1,13 +1,69 @@
 #!/usr/bin/env python3
 """Module for filtering sensitive information from log messages."""
 import re
+import atexit
+import copy
 import logging
 import mysql.connector
 import os
-from typing import List
+import queue
+import random
+import sys
+import threading
+import time
+from functools import lru_cache, partial
+from logging.handlers import QueueHandler, QueueListener
+from typing import (Callable, Iterable, Iterator, List, Mapping, Optional,
+                    TextIO, Tuple, Union)
+
+from db_pool import get_pool
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+PATTERN_CACHE_SIZE = 128
+LOG_QUEUE_SIZE = 10000
+RATE_LIMIT_KEYS = 10000
+SUMMARY_INTERVAL = 60.0
+EXPORT_BATCH_SIZE = 1000
+_LOGGER_LOCK = threading.Lock()
+_LOGGER_STATE = {}
+
+
+@lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def _redactor(fields: Tuple[str, ...], redaction: str, separator: str,
+              binary: bool = False) -> Callable[[str], str]:
+    """
+    Build (once per key) the substitution used to obfuscate fields.
+
+    Args:
+        fields (Tuple[str, ...]): Fields to obfuscate.
+        redaction (str): String to replace the field values with.
+        separator (str): Character separating fields in the log line.
+        binary (bool): Return a function redacting UTF-8 encoded `bytes`
+            messages instead of `str` ones.
+
+    Returns:
+        Callable[[str], str]: Function redacting a single message.
+    """
+    pattern = '({})=.*?{}'.format(
+        '|'.join(map(re.escape, fields)),
+        re.escape(separator)
+    )
+    replacement = r'\1=' + redaction + separator
+    if binary:
+        pattern = pattern.encode('utf-8')
+        replacement = replacement.encode('utf-8')
+    return partial(re.compile(pattern).sub, replacement)
+
+
+def pattern_cache_info():
+    """
+    Report hit/miss counters of the compiled redaction pattern cache.
+
+    Returns:
+        functools._CacheInfo: hits, misses, maxsize and currsize.
+    """
+    return _redactor.cache_info()
 
 
 def filter_datum(fields: List[str], redaction: str,
@@ -24,29 +80,115 @@ def filter_datum(fields: List[str], redaction: str,
     Returns:
         str: The obfuscated log message.
     """
-    pattern = '({})=.*?{}'.format(
-        '|'.join(map(re.escape, fields)),
-        re.escape(separator)
-    )
-    return re.sub(pattern, r'\1=' + redaction + separator, message)
+    return _redactor(tuple(fields), redaction, separator)(message)
+
+
+def filter_data(fields: List[str], redaction: str,
+                messages: Iterable[Union[str, bytes]],
+                separator: str) -> Iterator[Union[str, bytes]]:
+    """
+    Lazily obfuscate specified fields in many log messages.
+
+    Messages may be `str` or UTF-8 encoded `bytes`; each one is redacted
+    exactly as filter_datum would, with a single compiled pattern per
+    type, and comes back with its input type.
+
+    Args:
+        fields (List[str]): List of strings representing fields to obfuscate.
+        redaction (str): String to replace the field values with.
+        messages (Iterable[Union[str, bytes]]): Log lines to obfuscate.
+        separator (str): Character separating fields in the log lines.
+
+    Yields:
+        Union[str, bytes]: The obfuscated log messages, in order.
+    """
+    fields = tuple(fields)
+    redact_str = _redactor(fields, redaction, separator)
+    redact_bytes = None
+    for message in messages:
+        if isinstance(message, str):
+            yield redact_str(message)
+        else:
+            if redact_bytes is None:
+                redact_bytes = _redactor(fields, redaction, separator, True)
+            yield redact_bytes(message)
 
 
 class RedactingFormatter(logging.Formatter):
-    """Redacting Formatter class for log obfuscation."""
+    """Redacting Formatter class for log obfuscation.
+
+    In structured mode, records carrying a field/value mapping (through
+    ``extra={"data": {...}}`` or as the single ``record.args`` mapping)
+    are redacted by key before rendering; only their free-text message
+    goes through the regex pass, not the whole formatted line.
+    """
 
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
+    DATA_ATTR = "data"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], structured: bool = False):
         """
         Initialize the RedactingFormatter.
 
         Args:
             fields (List[str]): List of fields to redact in log messages.
+            structured (bool): Redact field/value mappings by key instead
+                of scanning the rendered message.
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.structured = structured
+        self._field_set = frozenset(fields)
+        self._redact = _redactor(tuple(fields), self.REDACTION,
+                                 self.SEPARATOR)
+
+    def render_fields(self, data: Mapping) -> str:
+        """
+        Render a field/value mapping as redacted `name=value;` pairs.
+
+        Args:
+            data (Mapping): Field names mapped to their values.
+
+        Returns:
+            str: The pairs, with values of redacted fields obfuscated.
+        """
+        fields = self._field_set
+        redaction = self.REDACTION
+        separator = self.SEPARATOR
+        return " ".join(
+            "{}={}{}".format(key, redaction if key in fields else value,
+                             separator)
+            for key, value in data.items()
+        )
+
+    def _structured_record(self, record: logging.LogRecord
+                           ) -> Optional[logging.LogRecord]:
+        """
+        Build a copy of the record whose message is the redacted mapping.
+
+        Args:
+            record (logging.LogRecord): The log record to format.
+
+        Returns:
+            Optional[logging.LogRecord]: The copy, or None if the record
+            carries no field/value mapping.
+        """
+        data = getattr(record, self.DATA_ATTR, None)
+        if isinstance(data, Mapping):
+            prefix = record.getMessage()
+        elif isinstance(record.args, Mapping) and record.args:
+            data = record.args
+            prefix = str(record.msg)
+        else:
+            return None
+        prefix = self._redact(prefix)
+        message = self.render_fields(data)
+        structured = logging.makeLogRecord(record.__dict__)
+        structured.msg = prefix + " " + message if prefix else message
+        structured.args = None
+        return structured
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -58,27 +200,480 @@ class RedactingFormatter(logging.Formatter):
         Returns:
             str: The formatted and redacted log message.
         """
-        message = super().format(record)
-        return filter_datum(self.fields, self.REDACTION,
-                            message, self.SEPARATOR)
+        if self.structured:
+            structured = self._structured_record(record)
+            if structured is not None:
+                message = super().format(structured)
+                if record.exc_info or record.exc_text or record.stack_info:
+                    return self._redact(message)
+                return message
+        return self._redact(super().format(record))
+
+    def format_batch(self, name: str, messages: Iterable[str],
+                     level: int = logging.INFO, redact: bool = True) -> str:
+        """
+        Format and redact many messages logged at the same moment.
+
+        The prefix is rendered once for the whole batch and the redaction
+        runs once over the joined lines.
+
+        Args:
+            name (str): Name of the logger the lines are attributed to.
+            messages (Iterable[str]): Log messages, one per line.
+            level (int): Logging level of the lines.
+            redact (bool): Scan the lines for fields to obfuscate; pass
+                False for messages already redacted, e.g. by RowRedactor.
+
+        Returns:
+            str: The formatted and redacted lines, newline separated.
+        """
+        record = logging.makeLogRecord({
+            "name": name,
+            "levelno": level,
+            "levelname": logging.getLevelName(level),
+            "msg": "",
+        })
+        prefix = super().format(record)
+        lines = "\n".join(prefix + m for m in messages)
+        return self._redact(lines) if redact else lines
+
+
+def _row_template(column_names: Iterable[str]) -> str:
+    """
+    Precompute the `field=value` format string of a users row.
+
+    Args:
+        column_names (Iterable[str]): Column names of the cursor.
+
+    Returns:
+        str: A str.format template taking the row values positionally.
+    """
+    return "; ".join(
+        "{}={{}}".format(name.replace("{", "{{").replace("}", "}}"))
+        for name in column_names
+    )
+
+
+class RowRedactor:
+    """Positional redaction of the PII columns of database rows."""
+
+    def __init__(self, column_names: Iterable[str],
+                 fields: Iterable[str] = PII_FIELDS,
+                 redaction: str = RedactingFormatter.REDACTION):
+        """
+        Initialize the RowRedactor.
+
+        Args:
+            column_names (Iterable[str]): Column names of the cursor.
+            fields (Iterable[str]): Fields whose values are obfuscated.
+            redaction (str): String to replace the field values with.
+        """
+        self.column_names = tuple(column_names)
+        fields = frozenset(fields)
+        self.mask = tuple(i for i, name in enumerate(self.column_names)
+                          if name in fields)
+        self.redaction = redaction
+        self.template = _row_template(self.column_names)
+
+    def redact(self, row: Iterable) -> list:
+        """
+        Replace the values of the PII columns of a row.
+
+        Args:
+            row (Iterable): Column values, in cursor order.
+
+        Returns:
+            list: The row values with PII columns obfuscated.
+        """
+        values = list(row)
+        for index in self.mask:
+            values[index] = self.redaction
+        return values
+
+    def format(self, row: Iterable) -> str:
+        """
+        Render a row as a redacted `field=value` log message.
+
+        Args:
+            row (Iterable): Column values, in cursor order.
+
+        Returns:
+            str: The redacted log message.
+        """
+        return self.template.format(*self.redact(row))
+
+
+class UserDataQueueHandler(QueueHandler):
+    """Queue handler deferring redaction and I/O to a listener thread."""
+
+    def __init__(self, log_queue: queue.Queue, block: bool = False):
+        """
+        Initialize the UserDataQueueHandler.
+
+        Args:
+            log_queue (queue.Queue): Queue shared with the listener.
+            block (bool): Wait for room when the queue is full instead of
+                dropping the record.
+        """
+        super(UserDataQueueHandler, self).__init__(log_queue)
+        self.block = block
+        self.enqueued = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message and its arguments before enqueuing the record.
+
+        `msg % args` is evaluated in the logging thread, while the
+        arguments still hold the values they had at the call; redaction
+        and output are left to the listener. Records whose arguments are
+        a field/value mapping are handed over untouched, for structured
+        redaction.
+
+        Args:
+            record (logging.LogRecord): The log record to enqueue.
+
+        Returns:
+            logging.LogRecord: A copy with the merged message, or the
+            same record if there is nothing to merge.
+        """
+        if isinstance(record.args, Mapping) and record.args:
+            return record
+        if not record.args and isinstance(record.msg, str):
+            return record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Put the record on the queue, applying the drop/block policy.
+
+        Args:
+            record (logging.LogRecord): The log record to enqueue.
+        """
+        try:
+            self.queue.put(record, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.enqueued += 1
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+
+class UserDataQueueListener(QueueListener):
+    """Queue listener counting the records it formats and writes."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler):
+        """
+        Initialize the UserDataQueueListener.
+
+        Args:
+            log_queue (queue.Queue): Queue shared with the handler.
+            handlers (logging.Handler): Handlers doing the actual output.
+        """
+        super(UserDataQueueListener, self).__init__(log_queue, *handlers)
+        self.processed = 0
+        self.started_at = None
+
+    def start(self) -> None:
+        """Start the background thread and the throughput clock."""
+        self.started_at = time.monotonic()
+        super().start()
+
+    def enqueue_sentinel(self) -> None:
+        """Wait for room on a bounded queue rather than failing."""
+        self.queue.put(self._sentinel)
+
+    def handle(self, record: logging.LogRecord) -> None:
+        """
+        Format, redact and write the record off the caller's thread.
+
+        Args:
+            record (logging.LogRecord): The dequeued log record.
+        """
+        super().handle(record)
+        self.processed += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """Per-key token bucket and probabilistic sampling of log records.
+
+    Attached to the logger, it drops records before any handler sees
+    them, so suppressed records never pay the redaction cost. The key of
+    a record is its `rate_key` attribute (``extra={"rate_key": ...}``),
+    or else its logging call site. Suppressed records are counted and
+    reported by a summary line every `summary_interval` seconds, from a
+    timer if no record comes by, and by flush_summary() (stop_logger()
+    calls it).
+    """
+
+    def __init__(self, rate: float = None, burst: int = 10,
+                 sample_rate: float = 1.0,
+                 summary_interval: float = SUMMARY_INTERVAL,
+                 max_keys: int = RATE_LIMIT_KEYS):
+        """
+        Initialize the RateLimitFilter.
+
+        Args:
+            rate (float): Records per second allowed for each key, None
+                to disable rate limiting.
+            burst (int): Records a key may emit at once before being
+                limited to `rate`.
+            sample_rate (float): Probability of keeping a record.
+            summary_interval (float): Minimum seconds between two summary
+                lines.
+            max_keys (int): Number of buckets kept, oldest evicted first.
+        """
+        super(RateLimitFilter, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample_rate = sample_rate
+        self.summary_interval = summary_interval
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_summary = time.monotonic()
+        self._timer = None
+        self._logger_name = None
+        self.rate_limited = 0
+        self.sampled_out = 0
+
+    @staticmethod
+    def record_key(record: logging.LogRecord):
+        """
+        Return the key a record is rate limited under.
+
+        Args:
+            record (logging.LogRecord): The log record.
+        """
+        key = getattr(record, "rate_key", None)
+        if key is not None:
+            return key
+        return (record.name, record.pathname, record.lineno)
 
+    def _take_token(self, key, now: float) -> bool:
+        """Consume a token of the key's bucket if one is available."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+            bucket = self._buckets[key] = [float(self.burst), now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
 
-def get_logger() -> logging.Logger:
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Decide whether the record is emitted.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            bool: True if the record should be emitted.
+        """
+        if getattr(record, "rate_summary", False):
+            return True
+        now = time.monotonic()
+        keep = True
+        with self._lock:
+            self._logger_name = record.name
+            if (self.sample_rate < 1.0 and
+                    random.random() >= self.sample_rate):
+                self.sampled_out += 1
+                keep = False
+            elif (self.rate is not None and
+                    not self._take_token(self.record_key(record), now)):
+                self.rate_limited += 1
+                keep = False
+            summary = None
+            if now - self._last_summary >= self.summary_interval:
+                summary = self._pop_summary(now)
+            elif not keep:
+                self._schedule_summary(now)
+        if summary is not None:
+            self._emit_summary(record.name, summary)
+        return keep
+
+    def _schedule_summary(self, now: float) -> None:
+        """Start a timer writing the summary at the end of the interval."""
+        if self._timer is None:
+            delay = self._last_summary + self.summary_interval - now
+            self._timer = threading.Timer(max(delay, 0.0),
+                                          self.flush_summary)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush_summary(self) -> None:
+        """Write the summary line of the records suppressed so far."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            summary = self._pop_summary(time.monotonic())
+            name = self._logger_name
+        if summary is not None and name is not None:
+            self._emit_summary(name, summary)
+
+    @staticmethod
+    def _emit_summary(name: str, summary: str) -> None:
+        """Hand a summary line to the handlers of a logger."""
+        logging.getLogger(name).handle(logging.makeLogRecord({
+            "name": name,
+            "levelno": logging.WARNING,
+            "levelname": logging.getLevelName(logging.WARNING),
+            "msg": summary,
+            "rate_summary": True,
+        }))
+
+    def _pop_summary(self, now: float) -> Optional[str]:
+        """Build the summary line and reset the counters."""
+        elapsed = now - self._last_summary
+        self._last_summary = now
+        suppressed = self.rate_limited + self.sampled_out
+        if not suppressed:
+            return None
+        summary = ("suppressed {} records in {:.1f}s (rate limited: {}, "
+                   "sampled out: {})".format(suppressed, elapsed,
+                                             self.rate_limited,
+                                             self.sampled_out))
+        self.rate_limited = 0
+        self.sampled_out = 0
+        return summary
+
+    def stats(self) -> dict:
+        """
+        Report the records suppressed since the last summary line.
+
+        Returns:
+            dict: Rate limited and sampled out counts, tracked keys.
+        """
+        with self._lock:
+            return {"rate_limited": self.rate_limited,
+                    "sampled_out": self.sampled_out,
+                    "keys": len(self._buckets)}
+
+
+def _reset_logger(logger: logging.Logger) -> None:
+    """
+    Detach the handler installed by get_logger and stop its listener.
+
+    Args:
+        logger (logging.Logger): The user_data logger.
+    """
+    limiter = _LOGGER_STATE.get("limiter")
+    if isinstance(limiter, RateLimitFilter):
+        limiter.flush_summary()
+    listener = _LOGGER_STATE.pop("listener", None)
+    if listener is not None:
+        listener.stop()
+    handler = _LOGGER_STATE.pop("handler", None)
+    if handler is not None:
+        logger.removeHandler(handler)
+        handler.close()
+    limiter = _LOGGER_STATE.pop("limiter", None)
+    if limiter is not None:
+        logger.removeFilter(limiter)
+    _LOGGER_STATE.pop("config", None)
+
+
+def get_logger(async_mode: bool = False, queue_size: int = LOG_QUEUE_SIZE,
+               block: bool = False,
+               limiter: logging.Filter = None,
+               structured: bool = False) -> logging.Logger:
     """
     Create and configure a logger for user data.
 
+    Repeated calls with the same settings return the logger as is;
+    different settings replace the previously installed handler.
+
+    Args:
+        async_mode (bool): Redact and write records on a background
+            listener thread fed through a queue.
+        queue_size (int): Maximum number of pending records in async
+            mode (0 for unbounded).
+        block (bool): Block callers when the queue is full instead of
+            dropping their records.
+        limiter (logging.Filter): Filter dropping records before they
+            are formatted, such as a RateLimitFilter.
+        structured (bool): Format records with a structured
+            RedactingFormatter, redacting field/value mappings by key.
+
     Returns:
         logging.Logger: A configured logger object.
     """
     logger = logging.getLogger("user_data")
-    logger.setLevel(logging.INFO)
-    logger.propagate = False
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
-    logger.addHandler(stream_handler)
+    config = (async_mode, queue_size, block, limiter, structured)
+    with _LOGGER_LOCK:
+        if (_LOGGER_STATE.get("config") == config and
+                _LOGGER_STATE.get("handler") in logger.handlers):
+            return logger
+        _reset_logger(logger)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(RedactingFormatter(PII_FIELDS,
+                                                       structured))
+        handler = stream_handler
+        if async_mode:
+            log_queue = queue.Queue(maxsize=queue_size)
+            handler = UserDataQueueHandler(log_queue, block)
+            listener = UserDataQueueListener(log_queue, stream_handler)
+            listener.start()
+            _LOGGER_STATE["listener"] = listener
+        if ((async_mode or limiter is not None) and
+                not _LOGGER_STATE.get("atexit")):
+            atexit.register(stop_logger)
+            _LOGGER_STATE["atexit"] = True
+        if limiter is not None:
+            logger.addFilter(limiter)
+            _LOGGER_STATE["limiter"] = limiter
+        logger.addHandler(handler)
+        _LOGGER_STATE["handler"] = handler
+        _LOGGER_STATE["config"] = config
     return logger
 
 
+def stop_logger() -> None:
+    """
+    Flush pending records and detach the handler set by get_logger.
+    """
+    with _LOGGER_LOCK:
+        _reset_logger(logging.getLogger("user_data"))
+
+
+def logger_stats() -> dict:
+    """
+    Report throughput and queue-depth statistics of the async logger.
+
+    Returns:
+        dict: Counters of the running listener, or an empty dict when the
+        logger is not in async mode.
+    """
+    handler = _LOGGER_STATE.get("handler")
+    listener = _LOGGER_STATE.get("listener")
+    if listener is None:
+        return {}
+    elapsed = time.monotonic() - listener.started_at
+    return {
+        "enqueued": handler.enqueued,
+        "dropped": handler.dropped,
+        "processed": listener.processed,
+        "queue_depth": handler.queue.qsize(),
+        "max_queue_depth": handler.max_depth,
+        "records_per_sec": listener.processed / elapsed if elapsed else 0.0,
+    }
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """
     Create a connection to the database.
@@ -103,19 +698,55 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
 def main() -> None:
     """
     Retrieve all rows from the users table and display each row in a
-    filtered format.
-    """
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM users;")
-
-    logger = get_logger()
-    for row in cursor:
-        message = "; ".join(f"{field}={value}" for field, value in
-                            zip(cursor.column_names, row))
-        logger.info(message)
-    cursor.close()
-    db.close()
+    filtered format, in batches (see export_users).
+    """
+    export_users()
+    get_pool().close()
+
+
+def export_users(db=None, batch_size: int = EXPORT_BATCH_SIZE,
+                 stream: TextIO = None) -> int:
+    """
+    Stream the users table in batches, redacted, to a text stream.
+
+    Rows are fetched `batch_size` at a time from an unbuffered cursor,
+    their PII columns are replaced positionally by a RowRedactor built
+    once from the column names, and each batch is written with a single
+    write call.
+
+    Args:
+        db: Database connection, one borrowed from get_pool() if None
+            (MySQL, or SQLite with PERSONAL_DATA_DB_ENGINE=sqlite).
+        batch_size (int): Number of rows fetched and written at once.
+        stream (TextIO): Destination of the log lines, stderr if None.
+
+    Returns:
+        int: The number of exported rows.
+    """
+    if db is None:
+        with get_pool().connection() as db:
+            return export_users(db, batch_size, stream)
+    if stream is None:
+        stream = sys.stderr
+    formatter = RedactingFormatter(PII_FIELDS)
+    cursor = db.cursor(buffered=False)
+    count = 0
+    try:
+        cursor.execute("SELECT * FROM users;")
+        redactor = RowRedactor(cursor.column_names, PII_FIELDS,
+                               formatter.REDACTION)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            lines = formatter.format_batch(
+                "user_data", map(redactor.format, rows), redact=False)
+            stream.write(lines + "\n")
+            count += len(rows)
+        stream.flush()
+    finally:
+        cursor.close()
+    return count
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Main file: property check of filter_data against filter_datum
+
+Random messages, fields, redactions and separators are redacted by
+filter_data, as str, as UTF-8 bytes and mixed, and compared with filter_datum.
+Usage: ./main_filter_data.py [cases] [seed]
+"""
+import random
+import sys
+
+filter_datum = __import__('filtered_logger').filter_datum
+filter_data = __import__('filtered_logger').filter_data
+
+NAMES = ("name", "email", "phone", "ssn", "password", "ip", "na", "e.mail")
+ALPHABET = "abcXYZ019 .=;|,-_@*()[]+?\\éß€"
+
+
+def random_text(rng: random.Random, size: int) -> str:
+    """Random text, including regex and separator characters."""
+    return "".join(rng.choice(ALPHABET) for _ in range(size))
+
+
+def random_message(rng: random.Random, separator: str) -> str:
+    """Random `field=value<separator>` pairs with noise around them."""
+    parts = []
+    for _ in range(rng.randrange(6)):
+        parts.append(random_text(rng, rng.randrange(3)))
+        parts.append("{}={}".format(rng.choice(NAMES),
+                                    random_text(rng, rng.randrange(8))))
+        if rng.random() < 0.9:
+            parts.append(separator)
+    return "".join(parts)
+
+
+def main() -> None:
+    """Compare both functions on random cases and report mismatches."""
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rng = random.Random(seed)
+    failures = 0
+    for case in range(cases):
+        fields = rng.sample(NAMES, rng.randrange(1, 4))
+        redaction = rng.choice(("***", "xxx", "\\1", "€"))
+        separator = rng.choice((";", "|", ",", ".", "*", "+"))
+        messages = [random_message(rng, separator)
+                    for _ in range(rng.randrange(1, 8))]
+        expected = [filter_datum(fields, redaction, message, separator)
+                    for message in messages]
+        as_str = list(filter_data(fields, redaction, messages, separator))
+        as_bytes = [m.decode("utf-8") for m in filter_data(
+            fields, redaction, [m.encode("utf-8") for m in messages],
+            separator)]
+        mixed = [m if isinstance(m, str) else m.decode("utf-8")
+                 for m in filter_data(fields, redaction, [
+                     m.encode("utf-8") if i % 2 else m
+                     for i, m in enumerate(messages)], separator)]
+        if not expected == as_str == as_bytes == mixed:
+            failures += 1
+            print("case {}: fields={!r} redaction={!r} separator={!r} "
+                  "messages={!r}".format(case, fields, redaction,
+                                         separator, messages))
+    print("{} cases, {} failures".format(cases, failures))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Command-line tool obfuscating PII fields in existing log files.
+
+The input file is memory-mapped and split into line-aligned chunks that
+are redacted in a process pool with the `filter_datum` rules, then
+written to the output in their original order.
+
+Usage: ./redact_logs.py [-o OUTPUT] [-j WORKERS] INPUT
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_data
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+_WORKER_STATE = {}
+
+
+def chunk_bounds(data: mmap.mmap, chunk_size: int = CHUNK_SIZE
+                 ) -> Iterator[Tuple[int, int]]:
+    """
+    Split a mapped file into chunks ending on a line boundary.
+
+    Args:
+        data (mmap.mmap): The mapped input file.
+        chunk_size (int): Approximate size of a chunk in bytes.
+
+    Yields:
+        Tuple[int, int]: Start and end offsets of each chunk.
+    """
+    size = len(data)
+    start = 0
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = data.find(b"\n", end - 1)
+            end = size if newline == -1 else newline + 1
+        yield start, end
+        start = end
+
+
+def _init_worker(path: str, fields: Tuple[str, ...], redaction: str,
+                 separator: str) -> None:
+    """
+    Map the input file and keep the redaction rules once per worker process.
+    """
+    with open(path, "rb") as f:
+        _WORKER_STATE["data"] = mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+    _WORKER_STATE["rules"] = (fields, redaction, separator)
+
+
+def _redact_chunk(bounds: Tuple[int, int]) -> Tuple[bytes, int]:
+    """
+    Redact one chunk of the mapped input file.
+
+    Args:
+        bounds (Tuple[int, int]): Start and end offsets of the chunk.
+
+    Returns:
+        Tuple[bytes, int]: The redacted chunk and its number of lines,
+        counting a last line without a trailing newline.
+    """
+    start, end = bounds
+    chunk = _WORKER_STATE["data"][start:end]
+    fields, redaction, separator = _WORKER_STATE["rules"]
+    redacted = next(filter_data(fields, redaction, (chunk,), separator))
+    return redacted, chunk.count(b"\n") + (not chunk.endswith(b"\n"))
+
+
+def redact_file(input_path: str, output: BinaryIO,
+                fields: Tuple[str, ...] = PII_FIELDS,
+                redaction: str = RedactingFormatter.REDACTION,
+                separator: str = RedactingFormatter.SEPARATOR,
+                workers: int = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Redact a log file into a binary stream using a process pool.
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    whatever the size of the input.
+
+    Args:
+        input_path (str): Path of the log file to redact.
+        output (BinaryIO): Destination of the redacted lines.
+        fields (Tuple[str, ...]): Fields to obfuscate.
+        redaction (str): String to replace the field values with.
+        separator (str): Character separating fields in the log lines.
+        workers (int): Number of worker processes, one per CPU if None.
+        chunk_size (int): Approximate size of a chunk in bytes.
+
+    Returns:
+        int: The number of redacted lines.
+    """
+    if os.path.getsize(input_path) == 0:
+        return 0
+    workers = workers or os.cpu_count() or 1
+    initargs = (input_path, tuple(fields), redaction, separator)
+    lines = 0
+    with open(input_path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+            ProcessPoolExecutor(workers, initializer=_init_worker,
+                                initargs=initargs) as pool:
+        pending = deque()
+        for bounds in chunk_bounds(data, chunk_size):
+            if len(pending) >= 2 * workers:
+                chunk, count = pending.popleft().result()
+                output.write(chunk)
+                lines += count
+            pending.append(pool.submit(_redact_chunk, bounds))
+        while pending:
+            chunk, count = pending.popleft().result()
+            output.write(chunk)
+            lines += count
+    output.flush()
+    return lines
+
+
+def main() -> None:
+    """Parse the command line and redact the given log file."""
+    parser = argparse.ArgumentParser(
+        description="Obfuscate PII fields in an existing log file.")
+    parser.add_argument("input", help="log file to redact")
+    parser.add_argument("-o", "--output",
+                        help="redacted log file (default: stdout)")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="chunk size in bytes (default: %(default)s)")
+    parser.add_argument("--fields", default=",".join(PII_FIELDS),
+                        help="comma separated fields (default: %(default)s)")
+    parser.add_argument("--separator", default=RedactingFormatter.SEPARATOR)
+    parser.add_argument("--redaction", default=RedactingFormatter.REDACTION)
+    args = parser.parse_args()
+
+    if (args.output is not None and os.path.exists(args.output) and
+            os.path.samefile(args.input, args.output)):
+        parser.error("the output file must not be the input file")
+    fields = tuple(field for field in args.fields.split(",") if field)
+    started = time.monotonic()
+    if args.output is None:
+        lines = redact_file(args.input, sys.stdout.buffer, fields,
+                            args.redaction, args.separator, args.workers,
+                            args.chunk_size)
+    else:
+        with open(args.output, "wb") as output:
+            lines = redact_file(args.input, output, fields, args.redaction,
+                                args.separator, args.workers,
+                                args.chunk_size)
+    elapsed = time.monotonic() - started
+    print("redacted {} lines in {:.2f}s ({:.0f} lines/s)".format(
+        lines, elapsed, lines / elapsed if elapsed else 0),
+        file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
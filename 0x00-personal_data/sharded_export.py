@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Parallel export of the users table split into primary-key ranges.
+
+Each range is fetched and redacted on its own pooled connection in a
+worker thread; the output is either merged in key order or written as
+one file per shard.
+
+The users table of main.sql has no key column, so the caller names the
+integer column to split on: `rowid` on the SQLite stand-in, or a key
+added to the table on MySQL.
+
+Usage: ./sharded_export.py --key COLUMN [--shards N] [--workers N]
+                           [--output-dir DIR]
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, TextIO, Tuple
+
+from db_pool import ConnectionPool, get_pool
+from filtered_logger import (EXPORT_BATCH_SIZE, PII_FIELDS,
+                             RedactingFormatter, RowRedactor)
+
+
+SHARD_COUNT = 4
+
+
+class ExportProgress:
+    """Thread-safe progress and throughput of a sharded export."""
+
+    def __init__(self, shards: int = 0):
+        """
+        Initialize the ExportProgress.
+
+        Args:
+            shards (int): Total number of shards to export.
+        """
+        self.shards = shards
+        self.shards_done = 0
+        self.rows = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_rows(self, count: int) -> None:
+        """Account for `count` more exported rows."""
+        with self._lock:
+            self.rows += count
+
+    def shard_done(self) -> None:
+        """Account for one more completed shard."""
+        with self._lock:
+            self.shards_done += 1
+
+    def report(self) -> dict:
+        """
+        Snapshot the progress of the export.
+
+        Returns:
+            dict: Rows and shards done, elapsed seconds and rows/sec.
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                "rows": self.rows,
+                "shards_done": self.shards_done,
+                "shards": self.shards,
+                "elapsed": elapsed,
+                "rows_per_sec": self.rows / elapsed if elapsed else 0.0,
+            }
+
+
+def _check_key(key: str) -> str:
+    """Reject key column names that are not plain identifiers."""
+    if not re.fullmatch(r"\w+", key):
+        raise ValueError("invalid key column: {}".format(key))
+    return key
+
+
+def key_ranges(pool: ConnectionPool, key: str,
+               shards: int = SHARD_COUNT) -> List[Tuple[int, int]]:
+    """
+    Split the integer key space of the users table into ranges.
+
+    Args:
+        pool (ConnectionPool): Pool providing the connection.
+        key (str): Integer key column (`rowid` on SQLite).
+        shards (int): Number of ranges to produce.
+
+    Returns:
+        List[Tuple[int, int]]: Half-open [start, end) key ranges.
+    """
+    with pool.connection() as db:
+        cursor = db.cursor()
+        cursor.execute("SELECT MIN({0}), MAX({0}) FROM users;".format(
+            _check_key(key)))
+        low, high = cursor.fetchone()
+        cursor.close()
+    if low is None:
+        return []
+    step = max(1, -(-(high - low + 1) // shards))
+    return [(start, min(start + step, high + 1))
+            for start in range(low, high + 1, step)]
+
+
+def export_shard(pool: ConnectionPool, bounds: Tuple[int, int],
+                 output: TextIO, key: str,
+                 batch_size: int = EXPORT_BATCH_SIZE,
+                 progress: ExportProgress = None) -> int:
+    """
+    Fetch, redact and write the users rows of one key range.
+
+    Args:
+        pool (ConnectionPool): Pool providing the connection.
+        bounds (Tuple[int, int]): Half-open [start, end) key range.
+        output (TextIO): Destination of the log lines.
+        key (str): Integer key column (`rowid` on SQLite).
+        batch_size (int): Number of rows fetched and written at once.
+        progress (ExportProgress): Progress updated after each batch.
+
+    Returns:
+        int: The number of exported rows.
+    """
+    formatter = RedactingFormatter(PII_FIELDS)
+    count = 0
+    with pool.connection() as db:
+        cursor = db.cursor(buffered=False)
+        try:
+            cursor.execute(
+                "SELECT * FROM users WHERE {0} >= %s AND {0} < %s "
+                "ORDER BY {0};".format(_check_key(key)), bounds)
+            redactor = RowRedactor(cursor.column_names, PII_FIELDS,
+                                   formatter.REDACTION)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                output.write(formatter.format_batch(
+                    "user_data", map(redactor.format, rows),
+                    redact=False) + "\n")
+                count += len(rows)
+                if progress is not None:
+                    progress.add_rows(len(rows))
+        finally:
+            cursor.close()
+    if progress is not None:
+        progress.shard_done()
+    return count
+
+
+def _export_to_file(pool: ConnectionPool, bounds: Tuple[int, int],
+                    path: str, **kwargs) -> str:
+    """Export one shard into its own file and return the file path."""
+    with open(path, "w") as output:
+        export_shard(pool, bounds, output, **kwargs)
+    return path
+
+
+def _export_to_spool(pool: ConnectionPool, bounds: Tuple[int, int],
+                     **kwargs) -> TextIO:
+    """Export one shard into a rewound temporary file."""
+    spool = tempfile.TemporaryFile("w+")
+    try:
+        export_shard(pool, bounds, spool, **kwargs)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def export_sharded(key: str, pool: ConnectionPool = None,
+                   shards: int = SHARD_COUNT, workers: int = None,
+                   output_dir: str = None, stream: TextIO = None,
+                   batch_size: int = EXPORT_BATCH_SIZE,
+                   progress: ExportProgress = None) -> ExportProgress:
+    """
+    Export the users table in parallel, one key range per task.
+
+    With `output_dir`, each shard goes to `users.<n>.log` in it;
+    otherwise shards are spooled to temporary files and copied to
+    `stream` in key order as soon as all earlier shards are done.
+
+    Args:
+        key (str): Integer key column (`rowid` on SQLite).
+        pool (ConnectionPool): Pool providing connections, get_pool()
+            if None.
+        shards (int): Number of key ranges.
+        workers (int): Number of worker threads, one per shard if None.
+        output_dir (str): Directory receiving per-shard files.
+        stream (TextIO): Destination of the merged output, stderr if
+            None.
+        batch_size (int): Number of rows fetched and written at once.
+        progress (ExportProgress): Progress to update, a new one if None.
+
+    Returns:
+        ExportProgress: The final progress of the export.
+    """
+    pool = pool or get_pool()
+    ranges = key_ranges(pool, key, shards)
+    if progress is None:
+        progress = ExportProgress()
+    progress.shards = len(ranges)
+    if not ranges:
+        return progress
+    options = {"key": key, "batch_size": batch_size, "progress": progress}
+    with ThreadPoolExecutor(workers or len(ranges)) as executor:
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            futures = [executor.submit(
+                _export_to_file, pool, bounds,
+                os.path.join(output_dir, "users.{:04d}.log".format(index)),
+                **options) for index, bounds in enumerate(ranges)]
+            for future in futures:
+                future.result()
+            return progress
+        if stream is None:
+            stream = sys.stderr
+        futures = [executor.submit(_export_to_spool, pool, bounds, **options)
+                   for bounds in ranges]
+        try:
+            for future in futures:
+                with future.result() as spool:
+                    shutil.copyfileobj(spool, stream)
+        finally:
+            for future in futures:
+                if future.done() and future.exception() is None:
+                    future.result().close()
+    stream.flush()
+    return progress
+
+
+def main() -> None:
+    """Parse the command line and run a sharded export."""
+    parser = argparse.ArgumentParser(
+        description="Export the users table in parallel key ranges.")
+    parser.add_argument("--shards", type=int, default=SHARD_COUNT)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--key", required=True,
+                        help="integer key column, e.g. rowid on SQLite")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--output-dir",
+                        help="write one file per shard instead of "
+                             "merging them on stdout")
+    args = parser.parse_args()
+
+    progress = export_sharded(args.key, shards=args.shards,
+                              workers=args.workers,
+                              output_dir=args.output_dir,
+                              stream=sys.stdout,
+                              batch_size=args.batch_size)
+    report = progress.report()
+    print("exported {rows} rows in {shards_done}/{shards} shards, "
+          "{elapsed:.2f}s ({rows_per_sec:.0f} rows/s)".format(**report),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
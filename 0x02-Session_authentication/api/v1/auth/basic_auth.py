@@ -51,12 +51,11 @@ class BasicAuth(Auth):
         if user_pwd is None or not isinstance(user_pwd, str):
             return None
         try:
-            users = User.search({'email': user_email})
+            for user in User.iter_search({'email': user_email}):
+                if user.is_valid_password(user_pwd):
+                    return user
         except Exception:
             return None
-        for user in users:
-            if user.is_valid_password(user_pwd):
-                return user
         return None
 
     def current_user(self, request=None) -> TypeVar('User'):
@@ -45,10 +45,9 @@ class SessionDBAuth(SessionExpAuth):
         if session_id is None:
             return None
         try:
-            user_sessions = UserSession.search({'session_id': session_id})
-            if not user_sessions:
+            user_session = UserSession.first(session_id=session_id)
+            if user_session is None:
                 return None
-            user_session = user_sessions[0]
             expired_time = user_session.created_at + \
                 timedelta(seconds=self.session_duration)
             if expired_time < datetime.utcnow():
@@ -76,10 +75,9 @@ class SessionDBAuth(SessionExpAuth):
         if not user_id:
             return False
         try:
-            user_sessions = UserSession.search({'session_id': session_id})
-            if not user_sessions:
+            user_session = UserSession.first(session_id=session_id)
+            if user_session is None:
                 return False
-            user_session = user_sessions[0]
             user_session.remove()
             return True
         except Exception as e:
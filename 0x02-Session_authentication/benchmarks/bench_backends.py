@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+""" Backend benchmark: file storage against SQLite
+Usage: ./benchmarks/bench_backends.py [users ...]  (default: 1000 100000
+1000000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from models import base, file_backend  # noqa: E402
+from models.base import Base  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+BACKENDS = (
+    ("file", {"STORAGE_BACKEND": "file", "STORAGE_JOURNAL": "0"}),
+    ("file+journal", {"STORAGE_BACKEND": "file", "STORAGE_JOURNAL": "1"}),
+    ("sqlite", {"STORAGE_BACKEND": "sqlite"}),
+)
+LOOKUPS = 1000
+SAVES = 5
+
+
+def reset():
+    """ Forget every object, index and backend held in memory
+    """
+    for registry in (file_backend.DATA, file_backend.INDEXES,
+                     file_backend.SORTED_INDEXES, base.BACKENDS):
+        registry.clear()
+
+
+def per_op(func, args: list) -> float:
+    """ Mean duration of a call over arguments, in microseconds
+    """
+    start = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def run(count: int, env: dict) -> list:
+    """ Timings of one backend on `count` users
+    """
+    os.environ.update(env)
+    reset()
+    User.load_from_file()
+    start = time.perf_counter()
+    with Base.transaction():
+        for i in range(count):
+            User(email="user{}@hbtn.io".format(i), first_name="First",
+                 last_name="Last", _password="0" * 64).save()
+    insert = time.perf_counter() - start
+    reset()
+    start = time.perf_counter()
+    User.load_from_file()
+    load = time.perf_counter() - start
+    ids = [user.id for user in User.search(
+        {"email__in": ["user{}@hbtn.io".format(i) for i in
+                       random.sample(range(count), min(LOOKUPS, count))]})]
+    emails = ["user{}@hbtn.io".format(random.randrange(count))
+              for _ in range(LOOKUPS)]
+    get = per_op(User.get, ids)
+    search = per_op(lambda email: User.search({"email": email}), emails)
+    start = time.perf_counter()
+    User.count()
+    count_time = (time.perf_counter() - start) * 1e6
+    users = [User.get(i) for i in ids[:SAVES]]
+    save = per_op(lambda user: user.save(), users) / 1000
+    return [insert, load, get, search, count_time, save]
+
+
+def main():
+    """ Run every backend on each size in a fresh directory
+    """
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]
+    cwd = os.getcwd()
+    header = "{:<8} {:<13} {:>10} {:>9} {:>9} {:>11} {:>10} {:>9}"
+    print(header.format("users", "backend", "insert (s)", "load (s)",
+                        "get (us)", "search (us)", "count (us)",
+                        "save (ms)"))
+    row = "{:<8} {:<13} {:>10.2f} {:>9.3f} {:>9.1f} {:>11.1f} {:>10.1f} " \
+        "{:>9.2f}"
+    for count in sizes:
+        for name, env in BACKENDS:
+            with tempfile.TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                try:
+                    print(row.format(count, name, *run(count, env)),
+                          flush=True)
+                finally:
+                    reset()
+                    os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+""" Memory benchmark: in-memory size of model objects
+Usage: ./benchmarks/bench_memory.py [sessions]
+"""
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from models.user_session import UserSession  # noqa: E402
+
+
+class DictSession():
+    """ Session keeping its attributes in a per-instance dict, as
+    models did before __slots__
+    """
+
+    def __init__(self, **kwargs):
+        """ Initialize from attributes
+        """
+        self.id = kwargs['id']
+        self.created_at = kwargs['created_at']
+        self.updated_at = kwargs['updated_at']
+        self.user_id = kwargs['user_id']
+        self.session_id = kwargs['session_id']
+
+    def to_json(self, for_serialization: bool = False) -> dict:
+        """ Serialize as Base.to_json did, through __dict__
+        """
+        return dict(self.__dict__)
+
+
+def measure(cls, attributes: list, serialize: bool) -> int:
+    """ Bytes held by one object per attributes dict
+    With `serialize`, each object is serialized once, as every save()
+    does with the whole store
+    """
+    tracemalloc.start()
+    objs = [cls(**kwargs) for kwargs in attributes]
+    if serialize:
+        for obj in objs:
+            obj.to_json(True)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+    return size
+
+
+def main():
+    """ Compare dict-based and slotted sessions
+    Attribute values are shared, so only the objects themselves count
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    now = datetime.utcnow()
+    attributes = [{"id": str(i), "created_at": now, "updated_at": now,
+                   "user_id": "user", "session_id": str(i)}
+                  for i in range(count)]
+    print("{} sessions".format(count))
+    print("{:<18} {:>10} {:>14}".format("objects", "total (MB)",
+                                        "per object (B)"))
+    for label, cls, serialize in (("dict", DictSession, False),
+                                  ("dict, serialized", DictSession, True),
+                                  ("slots", UserSession, False),
+                                  ("slots, serialized", UserSession, True)):
+        size = measure(cls, attributes, serialize)
+        print("{:<18} {:>10.1f} {:>14.0f}".format(label, size / 2 ** 20,
+                                                  size / count))
+
+
+if __name__ == "__main__":
+    main()
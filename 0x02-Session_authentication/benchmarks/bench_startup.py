@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+""" Startup benchmark: loading large .db_*.json stores
+Usage: ./benchmarks/bench_startup.py [users]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from models.base import DATA, TIMESTAMP_FORMAT  # noqa: E402
+from models.user import User  # noqa: E402
+from models.user_session import UserSession  # noqa: E402
+
+
+def write_stores(count: int):
+    """ Write .db_User.json and .db_UserSession.json with `count` objects
+    """
+    now = datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+    users = {}
+    sessions = {}
+    for i in range(count):
+        user_id = str(uuid.uuid4())
+        users[user_id] = {"id": user_id, "created_at": now,
+                          "updated_at": now,
+                          "email": "user{}@hbtn.io".format(i),
+                          "_password": "0" * 64, "first_name": "First",
+                          "last_name": "Last"}
+        session_id = str(uuid.uuid4())
+        sessions[session_id] = {"id": session_id, "created_at": now,
+                                "updated_at": now, "user_id": user_id,
+                                "session_id": str(uuid.uuid4())}
+    with open(".db_User.json", "w") as f:
+        json.dump(users, f)
+    with open(".db_UserSession.json", "w") as f:
+        json.dump(sessions, f)
+
+
+def legacy_load(cls):
+    """ Loader as it was: json.load then strptime for every object
+    """
+    with open(".db_{}.json".format(cls.__name__)) as f:
+        objs_json = json.load(f)
+    objs = {}
+    for obj_id, obj_json in objs_json.items():
+        obj = cls.__new__(cls)
+        for key, value in obj_json.items():
+            setattr(obj, key, value)
+        obj.created_at = datetime.strptime(obj_json["created_at"],
+                                           TIMESTAMP_FORMAT)
+        obj.updated_at = datetime.strptime(obj_json["updated_at"],
+                                           TIMESTAMP_FORMAT)
+        objs[obj_id] = obj
+    DATA[cls.__name__] = objs
+
+
+def timed(label: str, func):
+    """ Print the duration of a call
+    """
+    start = time.perf_counter()
+    func()
+    print("{:<34} {:>8.3f}s".format(label, time.perf_counter() - start))
+
+
+def main():
+    """ Compare the load paths on generated stores
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        write_stores(count)
+        print("{} users, {} sessions".format(count, count))
+        timed("legacy strptime load (User)", lambda: legacy_load(User))
+        os.environ["STORAGE_LAZY_LOAD"] = "0"
+        timed("eager load (User)", User.load_from_file)
+        timed("eager load (User, UserSession)", lambda: (
+            User.load_from_file(), UserSession.load_from_file()))
+        os.environ["STORAGE_LAZY_LOAD"] = "1"
+        timed("lazy load (User)", User.load_from_file)
+        timed("lazy search by email", lambda: User.search(
+            {"email": "user{}@hbtn.io".format(count // 2)}))
+        timed("lazy all() materialization", User.all)
+
+
+if __name__ == "__main__":
+    main()
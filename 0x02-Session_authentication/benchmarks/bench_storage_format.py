@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Snapshot format benchmark: JSON against the binary format
+Usage: ./benchmarks/bench_storage_format.py [sessions]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from models.file_backend import DATA, FileBackend  # noqa: E402
+from models.user_session import UserSession  # noqa: E402
+
+
+def timed(func) -> float:
+    """ Duration of a call, in seconds
+    """
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    """ Save and load the same sessions in each format
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    backend = FileBackend()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        DATA["UserSession"] = {}
+        for _ in range(count):
+            session = UserSession(user_id=str(uuid.uuid4()),
+                                  session_id=str(uuid.uuid4()))
+            DATA["UserSession"][session.id] = session
+        print("{} sessions".format(count))
+        print("{:<8} {:>10} {:>10} {:>12}".format(
+            "format", "save (s)", "load (s)", "size (MB)"))
+        for storage_format in ("json", "binary"):
+            os.environ["STORAGE_FORMAT"] = storage_format
+            save = timed(lambda: backend.save_to_file(UserSession))
+            load = timed(UserSession.load_from_file)
+            size = os.path.getsize(backend.file_path(UserSession)) / 2 ** 20
+            print("{:<8} {:>10.3f} {:>10.3f} {:>12.1f}".format(
+                storage_format, save, load, size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+""" Process stress test of the shared store (STORAGE_SHARED=1)
+Usage: ./benchmarks/stress_processes.py [processes] [saves] [threshold]
+(default: 4 200 1000): forked workers save, search and remove users in
+the same files, compacting the journal every `threshold` records.
+Exits with status 1 if a save or removal was lost, or if a worker's
+view of the store differs from the files
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+os.environ["STORAGE_SHARED"] = "1"
+
+from models.file_backend import shared_enabled  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+REMOVE_EVERY = 7
+WORKER = {}
+
+
+def init_worker(barrier):
+    """ Keep the barrier the workers wait on before reading the store
+    """
+    WORKER["barrier"] = barrier
+
+
+def work(n: int, processes: int, saves: int) -> list:
+    """ Save `saves` users, removing one of its own every REMOVE_EVERY
+    saves and searching the users of another worker meanwhile.
+    Return the IDs the worker sees once every worker is done
+    """
+    User.load_from_file()
+    mine = []
+    for i in range(saves):
+        user = User(email="p{}_{}@hbtn.io".format(n, i))
+        user.save()
+        mine.append(user.id)
+        if i % 10 == 0:
+            User.search({"email": "p{}_{}@hbtn.io".format(
+                (n + 1) % processes, i // 2)})
+        if i % REMOVE_EVERY == REMOVE_EVERY - 1:
+            User.get(mine.pop(0)).remove()
+    WORKER["barrier"].wait()
+    return sorted(user.id for user in User.all())
+
+
+def main():
+    """ Run the workers, then compare their views with the files
+    """
+    args = [int(arg) for arg in sys.argv[1:4]]
+    processes, saves, threshold = args + [4, 200, 1000][len(args):]
+    if not shared_enabled():
+        print("shared storage needs fcntl file locks")
+        sys.exit(1)
+    os.environ["STORAGE_JOURNAL_COMPACT_THRESHOLD"] = str(threshold)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        User.load_from_file()
+        start = time.perf_counter()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(processes, init_worker,
+                          (context.Barrier(processes),)) as pool:
+            views = pool.starmap(work, [(n, processes, saves)
+                                        for n in range(processes)])
+        elapsed = time.perf_counter() - start
+        User.load_from_file()
+        stored = sorted(user.id for user in User.all())
+        os.chdir(cwd)
+    expected = processes * (saves - saves // REMOVE_EVERY)
+    consistent = all(view == stored for view in views)
+    print("{} processes x {} saves, compaction every {} records: {:.2f}s"
+          .format(processes, saves, threshold, elapsed))
+    print("users {} / {} expected, worker views {}, consistent {}".format(
+        len(stored), expected, [len(view) for view in views], consistent))
+    sys.exit(0 if len(stored) == expected and consistent else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+""" Thread stress test of the store: concurrent writers and readers
+Usage: ./benchmarks/stress_threads.py [writers] [saves] [readers]
+(default: 8 40 4), with any STORAGE_* settings in the environment.
+Exits with status 1 if a thread failed or a save was lost
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from models.user import User  # noqa: E402
+
+
+SEEDS = 2000
+
+
+def main():
+    """ Save users from writer threads while reader threads search and
+    get, then reload the store and count the users
+    """
+    args = [int(arg) for arg in sys.argv[1:4]]
+    writers, saves, readers = args + [8, 40, 4][len(args):]
+    cwd = os.getcwd()
+    errors = []
+    latencies = []
+    stop = threading.Event()
+
+    def write(n: int):
+        """ Save `saves` new users
+        """
+        try:
+            for i in range(saves):
+                User(email="w{}_{}@hbtn.io".format(n, i)).save()
+        except Exception as e:
+            errors.append(repr(e))
+
+    def read():
+        """ Search and get until the writers are done
+        """
+        worst = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                User.search({"email": "seed5@hbtn.io"})
+                User.get("missing")
+            except Exception as e:
+                errors.append(repr(e))
+            worst = max(worst, time.perf_counter() - start)
+            time.sleep(0.001)
+        latencies.append(worst)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        User.load_from_file()
+        with User.transaction():
+            for i in range(SEEDS):
+                User(email="seed{}@hbtn.io".format(i)).save()
+        threads = [threading.Thread(target=read) for _ in range(readers)]
+        writer_threads = [threading.Thread(target=write, args=(n,))
+                          for n in range(writers)]
+        start = time.perf_counter()
+        for thread in threads + writer_threads:
+            thread.start()
+        for thread in writer_threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+        User.flush()
+        User.load_from_file()
+        count = User.count()
+        os.chdir(cwd)
+    expected = SEEDS + writers * saves
+    print("{} writers x {} saves, {} readers: {:.2f}s, worst read {:.3f}s"
+          .format(writers, saves, readers, elapsed, max(latencies or [0])))
+    print("users {} / {} expected, errors {} {}".format(
+        count, expected, len(errors), sorted(set(errors))))
+    sys.exit(0 if count == expected and not errors else 1)
+
+
+if __name__ == "__main__":
+    main()
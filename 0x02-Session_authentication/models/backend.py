@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+""" Backend module: interface of model storages
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator, List, TypeVar
+
+
+class Backend(ABC):
+    """ Storage of the objects of model classes
+    Base delegates load_from_file(), get(), search(), save(), remove(),
+    count(), transaction() and flush() to the backend selected by
+    STORAGE_BACKEND. Backends implement iter_search(); search() collects
+    it
+    """
+
+    @abstractmethod
+    def load(self, cls):
+        """ Make the stored objects of a class available
+        """
+
+    @abstractmethod
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Object of a class by ID, or None
+        """
+
+    @abstractmethod
+    def iter_search(self, cls,
+                    attributes: dict) -> Iterator[TypeVar('Base')]:
+        """ Generate the objects of a class matching `attr` / `attr__op`
+        attributes, so that callers may stop at any match
+        """
+
+    def search(self, cls, attributes: dict) -> List[TypeVar('Base')]:
+        """ Objects of a class matching `attr` / `attr__op` attributes
+        """
+        return list(self.iter_search(cls, attributes))
+
+    @abstractmethod
+    def save(self, obj: TypeVar('Base')):
+        """ Store an object, new or updated
+        """
+
+    @abstractmethod
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+
+    @abstractmethod
+    def count(self, cls) -> int:
+        """ Number of objects of a class
+        """
+
+    @contextmanager
+    def transaction(self):
+        """ Group the writes of a block
+        """
+        yield
+
+    def flush(self):
+        """ Write what the backend holds back (nothing by default)
+        """
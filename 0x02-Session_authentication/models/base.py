@@ -2,39 +2,74 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator
+from os import getenv
+from functools import partial
+from itertools import islice
+from models.backend import Backend
+from models.file_backend import DATA, FileBackend
+from models.serializers import TIMESTAMP_FORMAT, parse_timestamp
+from models.sqlite_backend import SQLiteBackend
 import json
 import uuid
 
 
-TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+BACKENDS = {}
+
+
+def storage_backend() -> Backend:
+    """ Storage backend selected by STORAGE_BACKEND: file (default) or
+    sqlite, whose database is STORAGE_SQLITE_PATH (.db.sqlite3)
+    """
+    name = getenv("STORAGE_BACKEND", "file").lower()
+    if name == "sqlite":
+        db_path = getenv("STORAGE_SQLITE_PATH", ".db.sqlite3")
+        key = (name, db_path)
+        factory = partial(SQLiteBackend, db_path)
+    else:
+        key = ("file",)
+        factory = FileBackend
+    backend = BACKENDS.get(key)
+    if backend is None:
+        backend = BACKENDS.setdefault(key, factory())
+    return backend
 
 
 class Base():
     """ Base class
+    Attributes are declared in __slots__ rather than kept in a dict per
+    object. Subclasses without __slots__ still get a __dict__.
+    The encoded public form served by list endpoints is cached in
+    `_json_cache` on first use, until an attribute is set (values
+    mutated in place aren't tracked), unless CACHE_JSON is False
     """
+    __slots__ = ('id', 'created_at', 'updated_at', '_json_cache')
+    CACHE_JSON = True
+    INDEXED_ATTRIBUTES = ()
+    SORTED_ATTRIBUTES = ('created_at',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.id = kwargs['id'] if 'id' in kwargs else str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, invalidating the cached encoded form
+        """
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_json_cache', None)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -44,11 +79,34 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def _slot_names(cls) -> tuple:
+        """ Attribute slots of the class, base classes first
+        """
+        names = cls.__dict__.get('_SLOT_NAMES')
+        if names is None:
+            names = tuple(name for klass in reversed(cls.__mro__)
+                          for name in klass.__dict__.get('__slots__', ())
+                          if name not in ('__dict__', '__weakref__',
+                                          '_json_cache'))
+            cls._SLOT_NAMES = names
+        return names
+
+    def _attributes(self) -> Iterable[tuple]:
+        """ (name, value) of every attribute set on the object
+        """
+        for name in self.__class__._slot_names():
+            try:
+                yield name, getattr(self, name)
+            except AttributeError:
+                pass
+        yield from getattr(self, '__dict__', {}).items()
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._attributes():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,56 +115,63 @@ class Base():
                 result[key] = value
         return result
 
-    @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def to_json_bytes(self) -> bytes:
+        """ to_json() encoded as jsonify does: sorted keys, compact
+        Cached until an attribute is set, if CACHE_JSON
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        encoded = getattr(self, '_json_cache', None)
+        if encoded is None:
+            encoded = json.dumps(self.to_json(), sort_keys=True,
+                                 separators=(",", ":")).encode()
+            if self.CACHE_JSON:
+                object.__setattr__(self, '_json_cache', encoded)
+        return encoded
+
+    @staticmethod
+    def json_array(objs: Iterable[TypeVar('Base')]) -> bytes:
+        """ JSON array of objects, as jsonify([o.to_json() for o in objs])
+        returns it, from their cached encoded forms
+        """
+        return b"[" + b",".join(obj.to_json_bytes() for obj in objs) + \
+            b"]\n"
 
     @classmethod
-    def save_to_file(cls):
-        """ Save all objects to file
+    def load_from_file(cls):
+        """ Load all objects from the storage backend
+        """
+        storage_backend().load(cls)
+
+    @staticmethod
+    def transaction():
+        """ Context manager batching every save() and remove() of the
+        block, in the current thread, into one write when it exits.
+        Changes are written even if the block raises. Nested
+        transactions join the outermost one
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        return storage_backend().transaction()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @staticmethod
+    def flush():
+        """ Write every mutation the storage backend holds back
+        """
+        storage_backend().flush()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage_backend().save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage_backend().remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage_backend().count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +183,36 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage_backend().get(cls, id)
+
+    @classmethod
+    def iter_search(cls, attributes: dict = {}) -> Iterator[TypeVar('Base')]:
+        """ Generate all objects with matching attributes (see search)
+        """
+        return storage_backend().iter_search(cls, attributes)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def search(cls, attributes: dict = {}, limit: int = None,
+               offset: int = 0) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+        Keys may end with an operator: `attr__lt`, `__le`, `__gt`,
+        `__ge`, `__prefix` or `__in`; plain keys test equality.
+        `offset` matches are skipped, and at most `limit` returned
+        """
+        matching = cls.iter_search(attributes)
+        if limit is None and not offset:
+            return list(matching)
+        return list(islice(matching, offset,
+                           None if limit is None else offset + limit))
+
+    @classmethod
+    def first(cls, **attributes) -> TypeVar('Base'):
+        """ First object with matching attributes, or None
+        """
+        return next(cls.iter_search(attributes), None)
+
+    @classmethod
+    def exists(cls, **attributes) -> bool:
+        """ Whether an object has matching attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return cls.first(**attributes) is not None
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+""" File backend module: model storage in memory, persisted to
+.db_<Class> snapshot and journal files
+"""
+from contextlib import contextmanager
+from os import getenv, path
+from typing import Iterable, Iterator, List, TypeVar
+from models import journal, serializers
+from models.backend import Backend
+from models.flusher import Flusher
+from models.index import HashIndex, SortedIndex, matches, parse_query
+from models.lazy import LazyObjects
+from models.rwlock import RWLock
+from models.serializers import TIMESTAMP_ATTRIBUTES, parse_timestamp
+import atexit
+import os
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+DATA = {}
+JOURNAL_COMPACT_THRESHOLD = 1000
+JOURNALS = {}
+INDEXES = {}
+SORTED_INDEXES = {}
+SORTED_PENDING = set()
+INDEX_LOCK = threading.Lock()
+STORAGE_LOCK = threading.RLock()
+STORE_LOCK = RWLock()
+PENDING_LOCK = threading.Lock()
+FLUSH_LOCK = threading.Lock()
+TRANSACTIONS = threading.local()
+PENDING = {}
+FLUSHER = {}
+SHARED = {}
+SYNC_LOCK = threading.RLock()
+
+
+def storage_serializer():
+    """ Snapshot serializer selected by STORAGE_FORMAT (json or binary)
+    """
+    return serializers.SERIALIZERS.get(
+        getenv("STORAGE_FORMAT", "json").lower(),
+        serializers.SERIALIZERS["json"])
+
+
+def lazy_load_enabled() -> bool:
+    """ Lazy object materialization is enabled by STORAGE_LAZY_LOAD=1
+    """
+    return getenv("STORAGE_LAZY_LOAD", "0").lower() in ("1", "true", "yes")
+
+
+def shared_enabled() -> bool:
+    """ Storage shared by several processes is enabled by
+    STORAGE_SHARED=1, where fcntl file locks are available
+    """
+    return fcntl is not None and \
+        getenv("STORAGE_SHARED", "0").lower() in ("1", "true", "yes")
+
+
+def journal_enabled() -> bool:
+    """ Journaled storage is enabled by STORAGE_JOURNAL=1, and required
+    by shared storage
+    """
+    return shared_enabled() or \
+        getenv("STORAGE_JOURNAL", "0").lower() in ("1", "true", "yes")
+
+
+def _file_id(file_path: str) -> tuple:
+    """ Identity of a file version: inode, size and modification time
+    Return None if the file doesn't exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def flush_window() -> float:
+    """ Seconds during which writes are coalesced by the background
+    flusher, from STORAGE_FLUSH_WINDOW (0: write immediately)
+    """
+    try:
+        return max(float(getenv("STORAGE_FLUSH_WINDOW", 0)), 0)
+    except ValueError:
+        return 0
+
+
+def journal_compact_threshold() -> int:
+    """ Number of journal records triggering a compaction
+    """
+    try:
+        return int(getenv("STORAGE_JOURNAL_COMPACT_THRESHOLD",
+                          JOURNAL_COMPACT_THRESHOLD))
+    except ValueError:
+        return JOURNAL_COMPACT_THRESHOLD
+
+
+class FileBackend(Backend):
+    """ Objects held in memory (DATA), indexed (INDEXES,
+    SORTED_INDEXES) and persisted to the .db_<Class> snapshot and
+    journal files. get() and search() return the stored objects
+    themselves
+    """
+
+    @staticmethod
+    def file_path(cls) -> str:
+        """ Path of the snapshot file of a class
+        Its extension is the one of the STORAGE_FORMAT serializer
+        """
+        return ".db_{}.{}".format(cls.__name__,
+                                  storage_serializer().EXTENSION)
+
+    @staticmethod
+    def journal_path(cls) -> str:
+        """ Path of the journal file of a class
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    def read_files(self, cls) -> dict:
+        """ Serialized objects of the snapshot and journal files of a
+        class, keyed by ID
+        """
+        objs_json = {}
+        if path.exists(self.file_path(cls)):
+            objs_json = serializers.read(self.file_path(cls))
+        journal.replay(self.journal_path(cls) + ".old", objs_json)
+        journal.replay(self.journal_path(cls), objs_json)
+        return objs_json
+
+    def load(self, cls):
+        """ Load all objects from file
+        Journaled mutations are replayed over the snapshot.
+        With STORAGE_LAZY_LOAD=1, objects are only built on first access.
+        Writes pending in the background flusher are done first
+        """
+        self.flush()
+        if shared_enabled():
+            with self._file_lock(cls, shared=True), SYNC_LOCK:
+                self._load(cls)
+        else:
+            self._load(cls)
+
+    def _load(self, cls):
+        """ Load all objects from file, without locking the files
+        """
+        s_class = cls.__name__
+        file_path = self.file_path(cls)
+        journal_path = self.journal_path(cls)
+        objs_json = {}
+        snapshot_id = _file_id(file_path)
+        if snapshot_id is not None:
+            objs_json = serializers.read(file_path)
+        journal.replay(journal_path + ".old", objs_json)
+        records, offset = journal.read(journal_path)
+        for record in records:
+            journal.apply(objs_json, record)
+        JOURNALS[s_class] = {"entries": len(records), "compacting": False}
+        SHARED[s_class] = {"snapshot": snapshot_id,
+                           "journal": _file_id(journal_path),
+                           "offset": offset}
+        if lazy_load_enabled():
+            objs = LazyObjects(cls, objs_json)
+            with STORE_LOCK.write():
+                DATA[s_class] = objs
+                self._load_indexes(cls, objs_json, self._json_value,
+                                   sorted_indexes=False)
+                SORTED_PENDING.add(s_class)
+            return
+        objs = {}
+        for obj_id, obj_json in objs_json.items():
+            objs[obj_id] = cls(**obj_json)
+        with STORE_LOCK.write():
+            DATA[s_class] = objs
+            SORTED_PENDING.discard(s_class)
+            self._load_indexes(
+                cls, objs, lambda obj, attr: getattr(obj, attr, None))
+
+    @staticmethod
+    def _snapshot(cls) -> dict:
+        """ Copy of the objects of a class keyed by ID
+        Objects of a lazy store that were never built stay serialized
+        """
+        with STORE_LOCK.read():
+            return dict.copy(DATA.get(cls.__name__, {}))
+
+    @staticmethod
+    def _serialize(objs: dict) -> dict:
+        """ Serialize objects of a snapshot
+        """
+        return {obj_id: obj if isinstance(obj, dict) else obj.to_json(True)
+                for obj_id, obj in objs.items()}
+
+    def _snapshot_json(self, cls) -> dict:
+        """ Serialize all objects of a class
+        Only the copy holds the store lock, so readers and writers go
+        on while objects are serialized
+        """
+        return self._serialize(self._snapshot(cls))
+
+    def _write_snapshot(self, cls, objs_json: dict):
+        """ Atomically replace the snapshot file of a class
+        """
+        serializer = storage_serializer()
+        file_path = self.file_path(cls)
+        tmp_path = "{}.{}.tmp".format(file_path, threading.get_ident())
+        with open(tmp_path, 'wb' if serializer.BINARY else 'w') as f:
+            serializer.dump(objs_json, f)
+        os.replace(tmp_path, file_path)
+
+    def save_to_file(self, cls):
+        """ Save all objects of a class to file
+        The snapshot then holds every journaled mutation
+        """
+        journal_path = self.journal_path(cls)
+        with STORAGE_LOCK, self._file_lock(cls):
+            if shared_enabled():
+                self._sync_locked(cls)
+            self._write_snapshot(cls, self._snapshot_json(cls))
+            for old_path in (journal_path, journal_path + ".old"):
+                if path.exists(old_path):
+                    os.remove(old_path)
+            JOURNALS[cls.__name__] = {"entries": 0, "compacting": False}
+            self._track_files(cls)
+
+    def _journal(self, cls, records: List[dict]):
+        """ Append mutation records to the journal of a class
+        A background compaction starts past the threshold
+        """
+        s_class = cls.__name__
+        with STORAGE_LOCK:
+            if shared_enabled():
+                self._journal_shared(cls, records)
+            else:
+                journal.append(self.journal_path(cls), records)
+            state = JOURNALS.setdefault(
+                s_class, {"entries": 0, "compacting": False})
+            state["entries"] += len(records)
+            if state["compacting"] or \
+                    state["entries"] < journal_compact_threshold():
+                return
+            state["compacting"] = True
+        threading.Thread(target=self.compact, args=(cls,),
+                         daemon=True).start()
+
+    def _journal_shared(self, cls, records: List[dict]):
+        """ Append mutation records to a journal shared with other
+        processes, after applying the records they appended.
+        A reload meanwhile may have dropped the records from memory:
+        they are applied again where it differs
+        """
+        ids = {self._record_id(record) for record in records}
+        with self._file_lock(cls):
+            self._sync_locked(cls, skip=ids)
+            offset = journal.append(self.journal_path(cls), records)
+            self._track_files(cls, offset)
+        objs = DATA[cls.__name__]
+        for record in records:
+            current = objs.get(self._record_id(record))
+            if record["op"] == "save":
+                stale = current is None or \
+                    current.to_json(True) != record["obj"]
+            else:
+                stale = current is not None
+            if stale:
+                self._apply(cls, record)
+
+    def compact(self, cls):
+        """ Fold the journal of a class into a new snapshot
+        The journal is rotated so mutations can be appended meanwhile.
+        Shared journals stay locked until the snapshot is written
+        """
+        if shared_enabled():
+            with STORAGE_LOCK, self._file_lock(cls):
+                self._sync_locked(cls)
+                self._compact(cls)
+                self._track_files(cls)
+        else:
+            self._compact(cls)
+
+    def _compact(self, cls):
+        """ Fold the journal of a class into a new snapshot
+        """
+        s_class = cls.__name__
+        journal_path = self.journal_path(cls)
+        old_path = journal_path + ".old"
+        with STORAGE_LOCK:
+            objs = self._snapshot(cls)
+            if path.exists(journal_path):
+                os.replace(journal_path, old_path)
+            JOURNALS[s_class] = {"entries": 0, "compacting": True}
+        try:
+            self._write_snapshot(cls, self._serialize(objs))
+            if path.exists(old_path):
+                os.remove(old_path)
+        finally:
+            with STORAGE_LOCK:
+                JOURNALS[s_class]["compacting"] = False
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(cls, shared: bool = False):
+        """ Hold the lock file of a class against other processes
+        (an exclusive lock for writers, a shared one for readers).
+        Only taken in shared mode
+        """
+        if not shared_enabled():
+            yield
+            return
+        with open(".db_{}.lock".format(cls.__name__), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _track_files(self, cls, offset: int = 0):
+        """ Remember the files of a class as now up to date in memory
+        """
+        SHARED[cls.__name__] = {"snapshot": _file_id(self.file_path(cls)),
+                                "journal": _file_id(self.journal_path(cls)),
+                                "offset": offset}
+
+    def _files_changed(self, cls) -> bool:
+        """ Whether other processes changed the files of a class
+        """
+        state = SHARED.get(cls.__name__)
+        if state is None:
+            return True
+        if _file_id(self.file_path(cls)) != state["snapshot"]:
+            return True
+        journal_id = _file_id(self.journal_path(cls))
+        if journal_id is None:
+            return state["journal"] is not None
+        return state["journal"] is None or \
+            journal_id[0] != state["journal"][0] or \
+            journal_id[1] != state["offset"]
+
+    def _sync(self, cls):
+        """ Apply the changes made by other processes in shared mode
+        Two stat() calls when there is none
+        """
+        if not shared_enabled() or not self._files_changed(cls):
+            return
+        with self._file_lock(cls, shared=True):
+            self._sync_locked(cls)
+
+    def _sync_locked(self, cls, skip: Iterable[str] = ()):
+        """ Apply changes made by other processes, files being locked
+        New journal records are applied one by one, except to the IDs
+        of `skip`; the whole store is reloaded after a compaction
+        """
+        s_class = cls.__name__
+        with SYNC_LOCK:
+            state = SHARED.get(s_class)
+            if not self._files_changed(cls):
+                return
+            journal_path = self.journal_path(cls)
+            journal_id = _file_id(journal_path)
+            if state is None or \
+                    _file_id(self.file_path(cls)) != state["snapshot"] or \
+                    (state["journal"] is not None and
+                     (journal_id is None or
+                      journal_id[0] != state["journal"][0] or
+                      journal_id[1] < state["offset"])):
+                self._load(cls)
+                return
+            records, offset = journal.read(journal_path, state["offset"])
+            with STORE_LOCK.write():
+                for record in records:
+                    if self._record_id(record) not in skip:
+                        self._apply(cls, record)
+            state["journal"] = _file_id(journal_path)
+            state["offset"] = offset
+            JOURNALS.setdefault(s_class, {"entries": 0, "compacting": False})
+            JOURNALS[s_class]["entries"] += len(records)
+
+    @staticmethod
+    def _record_id(record: dict) -> str:
+        """ ID of the object of a journal record
+        """
+        return record["obj"]["id"] if record["op"] == "save" \
+            else record["id"]
+
+    def _apply(self, cls, record: dict):
+        """ Apply a journal record to the objects of a class
+        """
+        objs = DATA.setdefault(cls.__name__, {})
+        with STORE_LOCK.write():
+            if record.get("op") == "save":
+                obj = cls(**record["obj"])
+                objs[obj.id] = obj
+                self._index(obj)
+            elif record.get("op") == "remove":
+                obj = objs.pop(record["id"], None)
+                if obj is not None:
+                    self._unindex(obj)
+
+    def _write(self, cls, records: List[dict]):
+        """ Persist mutation records of a class now: append them to the
+        journal, or rewrite the snapshot
+        """
+        if journal_enabled():
+            self._journal(cls, records)
+        else:
+            self.save_to_file(cls)
+
+    def _persist(self, cls, records: List[dict]):
+        """ Persist mutation records of a class
+        Inside a transaction they are written when it ends; with a
+        flush window, by the background flusher
+        """
+        pending = getattr(TRANSACTIONS, "pending", None)
+        if pending is not None:
+            pending.setdefault(cls, []).extend(records)
+            return
+        if flush_window() > 0:
+            with PENDING_LOCK:
+                PENDING.setdefault(cls, []).extend(records)
+            self._flusher().schedule()
+            return
+        self._write(cls, records)
+
+    def _flusher(self) -> Flusher:
+        """ Background flusher, started on first use
+        Pending writes are also flushed at interpreter exit
+        """
+        with STORAGE_LOCK:
+            flusher = FLUSHER.get("flusher")
+            if flusher is None:
+                flusher = Flusher(self.flush, flush_window())
+                FLUSHER["flusher"] = flusher
+                atexit.register(self.flush)
+        return flusher
+
+    def flush(self):
+        """ Write every mutation waiting for the background flusher
+        """
+        with FLUSH_LOCK:
+            with PENDING_LOCK:
+                pending = dict(PENDING)
+                PENDING.clear()
+            for cls, records in pending.items():
+                self._write(cls, records)
+
+    @staticmethod
+    def _indexes(cls) -> dict:
+        """ Hash indexes of a class, by indexed attribute
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class)
+        if indexes is None:
+            indexes = {attr: HashIndex() for attr in cls.INDEXED_ATTRIBUTES}
+            INDEXES[s_class] = indexes
+        return indexes
+
+    def _sorted_indexes(self, cls) -> dict:
+        """ Sorted indexes of a class, by sorted attribute
+        After a lazy load they are built on first use, from the objects
+        and the serialized objects of the store: until then, no
+        timestamp is parsed. Callers hold the store lock
+        """
+        s_class = cls.__name__
+        indexes = SORTED_INDEXES.get(s_class)
+        if indexes is not None and s_class not in SORTED_PENDING:
+            return indexes
+        with INDEX_LOCK:
+            indexes = SORTED_INDEXES.get(s_class)
+            if indexes is None:
+                indexes = {attr: SortedIndex()
+                           for attr in cls.SORTED_ATTRIBUTES}
+                SORTED_INDEXES[s_class] = indexes
+            if s_class in SORTED_PENDING:
+                objs = DATA.get(s_class, {})
+                for attr, index in indexes.items():
+                    index.load((obj_id, self._stored_value(obj, attr))
+                               for obj_id, obj in dict.items(objs))
+                SORTED_PENDING.discard(s_class)
+        return indexes
+
+    @staticmethod
+    def _json_value(obj_json: dict, attr: str):
+        """ Attribute value of a serialized object
+        """
+        value = obj_json.get(attr)
+        if attr in TIMESTAMP_ATTRIBUTES and value is not None:
+            value = parse_timestamp(value)
+        return value
+
+    def _stored_value(self, obj, attr: str):
+        """ Attribute value of an object of the store, built or still
+        serialized
+        """
+        if isinstance(obj, dict):
+            return self._json_value(obj, attr)
+        return getattr(obj, attr, None)
+
+    def _load_indexes(self, cls, objs: dict, value_of,
+                      sorted_indexes: bool = True):
+        """ Rebuild the indexes of a class from objects keyed by ID
+        `value_of(obj, attr)` reads an attribute of an object. Sorted
+        indexes are left alone unless `sorted_indexes`
+        """
+        for attr, index in self._indexes(cls).items():
+            index.clear()
+            for obj_id, obj in objs.items():
+                index.add(obj_id, value_of(obj, attr))
+        if not sorted_indexes:
+            return
+        for attr, index in self._sorted_indexes(cls).items():
+            index.load((obj_id, value_of(obj, attr))
+                       for obj_id, obj in objs.items())
+
+    def _index(self, obj: TypeVar('Base')):
+        """ Index an object under its indexed attributes
+        """
+        cls = obj.__class__
+        for attr, index in self._indexes(cls).items():
+            index.add(obj.id, getattr(obj, attr, None))
+        for attr, index in self._sorted_indexes(cls).items():
+            index.add(obj.id, getattr(obj, attr, None))
+
+    def _unindex(self, obj: TypeVar('Base')):
+        """ Drop an object from the indexes
+        """
+        cls = obj.__class__
+        for index in list(self._indexes(cls).values()) + \
+                list(self._sorted_indexes(cls).values()):
+            index.remove(obj.id)
+
+    def _candidate_ids(self, cls, conditions: list) -> list:
+        """ IDs to scan for a query, from its most selective index
+        Return None if no condition can use an index
+        """
+        hashes = self._indexes(cls)
+        sorted_indexes = None
+        best = None
+        bounds = {}
+        for attr, op, value in conditions:
+            ids = None
+            if attr in hashes and op == "eq":
+                ids = hashes[attr].lookup(value)
+            elif attr in hashes and op == "in":
+                try:
+                    lookups = [hashes[attr].lookup(v) for v in value]
+                except TypeError:
+                    lookups = [None]
+                if None not in lookups:
+                    ids = list(dict.fromkeys(
+                        i for lookup in lookups for i in lookup))
+            elif attr in cls.SORTED_ATTRIBUTES:
+                if sorted_indexes is None:
+                    sorted_indexes = self._sorted_indexes(cls)
+                found = sorted_indexes[attr].bounds(op, value)
+                if found is not None:
+                    start, end = bounds.get(attr, found)
+                    bounds[attr] = (max(start, found[0]), min(end, found[1]))
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = ids
+        for attr, (start, end) in bounds.items():
+            if best is None or end - start < len(best):
+                best = sorted_indexes[attr].lookup(start, end)
+        return best
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Object of a class by ID, or None
+        """
+        self._sync(cls)
+        with STORE_LOCK.read():
+            return DATA[cls.__name__].get(obj_id)
+
+    def iter_search(self, cls,
+                    attributes: dict) -> Iterator[TypeVar('Base')]:
+        """ Generate the objects of a class matching attributes
+        The most selective index of the query narrows the scan to the
+        objects indexed under matching values, as of their last save().
+        Only the IDs to scan are copied under the store lock: objects
+        (and those of a lazy store) are read as the generator goes
+        """
+        conditions = parse_query(attributes)
+        self._sync(cls)
+        with STORE_LOCK.read():
+            objs = DATA[cls.__name__]
+            ids = self._candidate_ids(cls, conditions)
+            if ids is None:
+                ids = list(objs)
+        for obj_id in ids:
+            obj = objs.get(obj_id)
+            if obj is None:
+                continue
+            for k, op, v in conditions:
+                if not matches(getattr(obj, k), op, v):
+                    break
+            else:
+                yield obj
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store an object in memory, then persist it
+        """
+        cls = obj.__class__
+        with STORE_LOCK.write():
+            DATA[cls.__name__][obj.id] = obj
+            self._index(obj)
+        self._persist(cls, [journal.save_record(obj.to_json(True))])
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object from memory, then persist it
+        """
+        cls = obj.__class__
+        with STORE_LOCK.write():
+            removed = DATA[cls.__name__].pop(obj.id, None) is not None
+            if removed:
+                self._unindex(obj)
+        if removed:
+            self._persist(cls, [journal.remove_record(obj.id)])
+
+    def count(self, cls) -> int:
+        """ Number of objects of a class
+        """
+        self._sync(cls)
+        return len(DATA[cls.__name__].keys())
+
+    @contextmanager
+    def transaction(self):
+        """ Collect the mutation records of the block, then write them
+        once per class. Changes apply in memory right away
+        """
+        pending = getattr(TRANSACTIONS, "pending", None)
+        if pending is not None:
+            yield
+            return
+        TRANSACTIONS.pending = {}
+        try:
+            yield
+        finally:
+            pending = TRANSACTIONS.pending
+            TRANSACTIONS.pending = None
+            for cls, records in pending.items():
+                self._write(cls, records)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+""" Flusher module: background coalescing of storage writes
+"""
+from typing import Callable
+import threading
+import traceback
+
+
+class Flusher():
+    """ Background thread calling `flush` once per window in which
+    writes were scheduled, so that they reach the disk together
+    """
+
+    def __init__(self, flush: Callable, window: float):
+        """ Start the thread
+        `window` is the delay, in seconds, between the first scheduled
+        write and the flush
+        """
+        self.window = window
+        self._flush = flush
+        self._scheduled = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self):
+        """ Request a flush at the end of the current window
+        """
+        self._scheduled.set()
+
+    def _run(self):
+        """ Flush once per window with scheduled writes, until stopped
+        """
+        while not self._stopped.is_set():
+            self._scheduled.wait()
+            self._stopped.wait(self.window)
+            self._scheduled.clear()
+            try:
+                self._flush()
+            except Exception:
+                traceback.print_exc()
+
+    def stop(self):
+        """ Stop the thread after a last flush
+        """
+        self._stopped.set()
+        self._scheduled.set()
+        self._thread.join()
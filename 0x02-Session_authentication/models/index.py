@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+""" Index module: secondary indexes of model attributes
+"""
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Tuple
+
+
+OPERATORS = ("eq", "lt", "le", "gt", "ge", "prefix", "in")
+
+
+class HashIndex():
+    """ Equality index mapping attribute values to object IDs
+    """
+
+    def __init__(self):
+        """ Initialize an empty index
+        """
+        self.ids_by_value = {}
+        self.value_by_id = {}
+        self.unhashable = {}
+
+    def add(self, obj_id: str, value):
+        """ Index (or re-index) an object under its attribute value
+        """
+        self.remove(obj_id)
+        try:
+            self.ids_by_value.setdefault(value, {})[obj_id] = None
+        except TypeError:
+            self.unhashable[obj_id] = None
+            return
+        self.value_by_id[obj_id] = value
+
+    def remove(self, obj_id: str):
+        """ Drop an object from the index
+        """
+        if obj_id in self.value_by_id:
+            value = self.value_by_id.pop(obj_id)
+            ids = self.ids_by_value[value]
+            del ids[obj_id]
+            if not ids:
+                del self.ids_by_value[value]
+        else:
+            self.unhashable.pop(obj_id, None)
+
+    def lookup(self, value) -> List[str]:
+        """ IDs of the objects indexed under a value
+        Return None if the value can't be looked up
+        """
+        try:
+            ids = self.ids_by_value.get(value, {})
+        except TypeError:
+            return None
+        return list(ids) + list(self.unhashable)
+
+    def clear(self):
+        """ Empty the index
+        """
+        self.ids_by_value.clear()
+        self.value_by_id.clear()
+        self.unhashable.clear()
+
+
+class SortedIndex():
+    """ Ordered index of attribute values for range and prefix lookups
+    Entries are sorted by (value, ID), so that an object's entry is
+    found by bisection even among many equal values. Objects whose
+    value is None, or can't be ordered with the indexed values, are
+    left out of the index
+    """
+
+    def __init__(self):
+        """ Initialize an empty index
+        """
+        self.values = []
+        self.ids = []
+        self.value_by_id = {}
+
+    def _position(self, obj_id: str, value) -> int:
+        """ Position of the (value, ID) entry, present or to insert
+        """
+        start = bisect_left(self.values, value)
+        end = bisect_right(self.values, value, start)
+        return bisect_left(self.ids, obj_id, start, end)
+
+    def add(self, obj_id: str, value):
+        """ Index (or re-index) an object under its attribute value
+        Nothing is done if the object is indexed under that value
+        """
+        if obj_id in self.value_by_id:
+            if self.value_by_id[obj_id] == value:
+                return
+            self.remove(obj_id)
+        if value is None:
+            return
+        try:
+            i = self._position(obj_id, value)
+        except TypeError:
+            return
+        self.values.insert(i, value)
+        self.ids.insert(i, obj_id)
+        self.value_by_id[obj_id] = value
+
+    def remove(self, obj_id: str):
+        """ Drop an object from the index
+        """
+        if obj_id not in self.value_by_id:
+            return
+        i = self._position(obj_id, self.value_by_id.pop(obj_id))
+        del self.values[i]
+        del self.ids[i]
+
+    def load(self, pairs: Iterable[Tuple[str, object]]):
+        """ Replace the content of the index by (ID, value) pairs
+        Sorting once is much cheaper than inserting one by one
+        """
+        self.clear()
+        entries = []
+        for obj_id, value in pairs:
+            if value is not None:
+                entries.append((value, obj_id))
+        try:
+            entries.sort()
+        except TypeError:
+            for value, obj_id in entries:
+                self.add(obj_id, value)
+            return
+        self.values = [value for value, _ in entries]
+        self.ids = [obj_id for _, obj_id in entries]
+        self.value_by_id = {obj_id: value for value, obj_id in entries}
+
+    def bounds(self, op: str, value) -> Tuple[int, int]:
+        """ Positions [start, end) of the values matching `op value`
+        Return None if the operator or the value can't use the index
+        """
+        values = self.values
+        try:
+            if op == "eq":
+                return bisect_left(values, value), bisect_right(values, value)
+            if op == "lt":
+                return 0, bisect_left(values, value)
+            if op == "le":
+                return 0, bisect_right(values, value)
+            if op == "gt":
+                return bisect_right(values, value), len(values)
+            if op == "ge":
+                return bisect_left(values, value), len(values)
+            if op == "prefix" and isinstance(value, str):
+                start = bisect_left(values, value)
+                if value == "":
+                    return start, len(values)
+                upper = value[:-1] + chr(ord(value[-1]) + 1)
+                return start, bisect_left(values, upper)
+        except (TypeError, ValueError):
+            return None
+        return None
+
+    def lookup(self, start: int, end: int) -> List[str]:
+        """ IDs of the objects between two positions, by value then ID
+        """
+        return self.ids[start:end]
+
+    def clear(self):
+        """ Empty the index
+        """
+        self.values.clear()
+        self.ids.clear()
+        self.value_by_id.clear()
+
+
+def parse_query(attributes: dict) -> List[Tuple[str, str, object]]:
+    """ Split search attributes into (attribute, operator, value)
+    `attr__op` keys select an operator of OPERATORS, plain keys `eq`
+    """
+    conditions = []
+    for key, value in attributes.items():
+        attr, sep, op = key.rpartition("__")
+        if sep and attr and op in OPERATORS:
+            conditions.append((attr, op, value))
+        else:
+            conditions.append((key, "eq", value))
+    return conditions
+
+
+def matches(value, op: str, target) -> bool:
+    """ Evaluate one condition against an attribute value
+    """
+    if op == "eq":
+        return value == target
+    if op == "in":
+        return value in target
+    if op == "prefix":
+        return isinstance(value, str) and value.startswith(target)
+    if value is None:
+        return False
+    try:
+        if op == "lt":
+            return value < target
+        if op == "le":
+            return value <= target
+        if op == "gt":
+            return value > target
+        if op == "ge":
+            return value >= target
+    except TypeError:
+        return False
+    return False
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+""" Journal module: append-only log of model mutations
+"""
+from os import path
+from typing import List, Tuple
+import json
+import os
+
+
+def save_record(obj_json: dict) -> dict:
+    """ Journal record of an object saved with its serialized state
+    """
+    return {"op": "save", "obj": obj_json}
+
+
+def remove_record(obj_id: str) -> dict:
+    """ Journal record of a removed object
+    """
+    return {"op": "remove", "id": obj_id}
+
+
+def append(file_path: str, records: List[dict]) -> int:
+    """ Append records to a journal file, one JSON document per line
+    Return the size of the file, in bytes
+    """
+    if not records:
+        return path.getsize(file_path) if path.exists(file_path) else 0
+    lines = "".join(json.dumps(record) + "\n" for record in records)
+    with open(file_path, 'a') as f:
+        f.write(lines)
+        f.flush()
+        return os.fstat(f.fileno()).st_size
+
+
+def apply(objs_json: dict, record: dict):
+    """ Apply one journal record to serialized objects keyed by ID
+    """
+    if record.get("op") == "save":
+        obj_json = record["obj"]
+        objs_json[obj_json["id"]] = obj_json
+    elif record.get("op") == "remove":
+        objs_json.pop(record["id"], None)
+
+
+def read(file_path: str, offset: int = 0) -> Tuple[List[dict], int]:
+    """ Complete records of a journal file from a byte offset
+    Return them with the offset following the last one
+    """
+    records = []
+    if not path.exists(file_path):
+        return records, offset
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            records.append(json.loads(line))
+            offset += len(line)
+    return records, offset
+
+
+def replay(file_path: str, objs_json: dict) -> int:
+    """ Apply every complete record of a journal file
+    Return the number of records applied
+    """
+    records, _ = read(file_path)
+    for record in records:
+        apply(objs_json, record)
+    return len(records)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+""" Lazy module: objects materialized on first access
+"""
+from typing import Callable
+import threading
+
+
+class LazyObjects(dict):
+    """ Dictionary of objects by ID, holding serialized objects until
+    they are first read
+    """
+
+    def __init__(self, factory: Callable, objs_json: dict):
+        """ Initialize from serialized objects keyed by ID
+        `factory(**obj_json)` builds an object
+        """
+        super().__init__(objs_json)
+        self._factory = factory
+        self._raw = set(objs_json)
+        self._lock = threading.Lock()
+
+    def _materialize(self, key):
+        """ Build the object of an ID still holding its serialized form
+        Concurrent readers of the same ID get the same object
+        """
+        if key in self._raw:
+            with self._lock:
+                if key in self._raw:
+                    value = self._factory(**super().__getitem__(key))
+                    super().__setitem__(key, value)
+                    self._raw.discard(key)
+                    return value
+        return super().__getitem__(key)
+
+    def materialize_all(self):
+        """ Build every object still held in serialized form
+        """
+        for key in list(self._raw):
+            self._materialize(key)
+
+    def __getitem__(self, key):
+        """ Object of an ID
+        """
+        return self._materialize(key)
+
+    def __setitem__(self, key, value):
+        """ Store an object
+        """
+        self._raw.discard(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        """ Remove an object
+        """
+        super().__delitem__(key)
+        self._raw.discard(key)
+
+    def get(self, key, default=None):
+        """ Object of an ID, or default
+        """
+        if key in self:
+            return self._materialize(key)
+        return default
+
+    def pop(self, key, *default):
+        """ Remove and return the object of an ID
+        """
+        if key in self:
+            value = self._materialize(key)
+            del self[key]
+            return value
+        return super().pop(key, *default)
+
+    def values(self):
+        """ All objects
+        """
+        self.materialize_all()
+        return super().values()
+
+    def items(self):
+        """ All (ID, object) pairs
+        """
+        self.materialize_all()
+        return super().items()
+
+    def copy(self) -> dict:
+        """ Plain dictionary of all objects
+        """
+        self.materialize_all()
+        return dict(super().items())
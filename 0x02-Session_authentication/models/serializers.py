@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+""" Serializers module: file formats of model snapshots
+
+Usage: python3 -m models.serializers SOURCE DESTINATION
+converts a snapshot between formats, picked by file extension
+(e.g. .db_User.json -> .db_User.bin)
+"""
+from array import array
+from datetime import datetime, timedelta
+from typing import BinaryIO
+import json
+import struct
+import sys
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TIMESTAMP_ATTRIBUTES = ('created_at', 'updated_at')
+EPOCH = datetime(1970, 1, 1)
+NO_TIMESTAMP = -2 ** 63
+
+
+def parse_timestamp(value) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+    datetime.fromisoformat is much faster than strptime for this format
+    """
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _default(value):
+    """ JSON representation of datetimes
+    """
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    raise TypeError("{} is not JSON serializable".format(type(value)))
+
+
+def _array_bytes(values: array) -> bytes:
+    """ Little-endian bytes of an array, whatever the host byte order
+    """
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array_from(typecode: str, payload: bytes) -> array:
+    """ Array of little-endian bytes, whatever the host byte order
+    """
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class JsonSerializer():
+    """ Snapshot as one JSON document: {id: {attribute: value}}
+    """
+    EXTENSION = "json"
+    BINARY = False
+
+    def dump(self, objs_json: dict, f):
+        """ Write serialized objects keyed by ID
+        json.dumps encodes in C, unlike the chunked json.dump
+        """
+        f.write(json.dumps(objs_json, default=_default))
+
+    def load(self, f) -> dict:
+        """ Read serialized objects keyed by ID
+        """
+        return json.load(f)
+
+
+class BinarySerializer():
+    """ Compact columnar snapshot
+
+    Layout, little-endian:
+      b"BDB1", uint32 object count, uint16 column count
+      then for each column:
+        uint16 name length, name (UTF-8), 1 byte type, uint64 payload
+        length, payload
+    Column types:
+      t: timestamps, int64 seconds since EPOCH (NO_TIMESTAMP for None)
+      s: strings without NUL characters: uint32 count of None values,
+         their uint32 positions, then the UTF-8 text of the other
+         strings joined by NUL
+      j: any other values, as a JSON list
+    Attributes missing from an object are stored as None
+    """
+    EXTENSION = "bin"
+    BINARY = True
+    MAGIC = b"BDB1"
+
+    @staticmethod
+    def _seconds(value) -> int:
+        """ Seconds since EPOCH of a datetime or timestamp string
+        """
+        if value is None:
+            return NO_TIMESTAMP
+        if not isinstance(value, datetime):
+            value = datetime.fromisoformat(value)
+        return (value - EPOCH) // timedelta(seconds=1)
+
+    def _encode_column(self, name: str, values: list) -> bytes:
+        """ Type byte and payload of a column
+        """
+        if name in TIMESTAMP_ATTRIBUTES:
+            try:
+                return b"t" + _array_bytes(
+                    array('q', map(self._seconds, values)))
+            except (TypeError, ValueError):
+                pass
+        if all(value is None or (type(value) is str and "\0" not in value)
+               for value in values):
+            nones = array('I', (i for i, value in enumerate(values)
+                                if value is None))
+            text = "\0".join(value for value in values if value is not None)
+            return b"s" + struct.pack('<I', len(nones)) + \
+                _array_bytes(nones) + text.encode('utf-8')
+        return b"j" + json.dumps(values, default=_default).encode('utf-8')
+
+    @staticmethod
+    def _decode_timestamps(payload: bytes, cache: dict) -> list:
+        """ Datetimes of a timestamp column
+        Equal timestamps share one (immutable) datetime object
+        """
+        seconds = _array_from('q', payload)
+        values = []
+        for value in seconds:
+            timestamp = cache.get(value)
+            if timestamp is None and value != NO_TIMESTAMP:
+                timestamp = EPOCH + timedelta(seconds=value)
+                cache[value] = timestamp
+            values.append(timestamp)
+        return values
+
+    @staticmethod
+    def _decode_strings(payload: bytes, count: int) -> list:
+        """ Values of a string column
+        """
+        none_count, = struct.unpack_from('<I', payload)
+        if none_count == count:
+            return [None] * count
+        end = 4 + 4 * none_count
+        values = payload[end:].decode('utf-8').split("\0")
+        if none_count:
+            nones = set(_array_from('I', payload[4:end]))
+            strings = iter(values)
+            values = [None if i in nones else next(strings)
+                      for i in range(count)]
+        return values
+
+    def _decode_column(self, kind: bytes, payload: bytes, count: int,
+                       cache: dict) -> list:
+        """ Values of a column
+        """
+        if kind == b"t":
+            return self._decode_timestamps(payload, cache)
+        if kind == b"s":
+            return self._decode_strings(payload, count)
+        return json.loads(payload.decode('utf-8'))
+
+    def dump(self, objs_json: dict, f: BinaryIO):
+        """ Write serialized objects keyed by ID
+        """
+        objs = list(objs_json.values())
+        names = list(dict.fromkeys(
+            name for obj in objs for name in obj))
+        chunks = [self.MAGIC, struct.pack('<IH', len(objs), len(names))]
+        for name in names:
+            encoded = self._encode_column(
+                name, [obj.get(name) for obj in objs])
+            name_bytes = name.encode('utf-8')
+            chunks.append(struct.pack('<H', len(name_bytes)))
+            chunks.append(name_bytes)
+            chunks.append(encoded[:1])
+            chunks.append(struct.pack('<Q', len(encoded) - 1))
+            chunks.append(encoded[1:])
+        f.write(b"".join(chunks))
+
+    def load(self, f: BinaryIO) -> dict:
+        """ Read serialized objects keyed by ID
+        """
+        data = f.read()
+        if data[:4] != self.MAGIC:
+            raise ValueError("not a binary snapshot")
+        count, ncolumns = struct.unpack_from('<IH', data, 4)
+        offset = 10
+        names = []
+        columns = []
+        cache = {}
+        for _ in range(ncolumns):
+            length, = struct.unpack_from('<H', data, offset)
+            offset += 2
+            names.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+            kind = data[offset:offset + 1]
+            size, = struct.unpack_from('<Q', data, offset + 1)
+            offset += 9
+            columns.append(self._decode_column(
+                kind, data[offset:offset + size], count, cache))
+            offset += size
+        objs = [dict(zip(names, row)) for row in zip(*columns)]
+        return {obj["id"]: obj for obj in objs}
+
+
+SERIALIZERS = {
+    "json": JsonSerializer(),
+    "binary": BinarySerializer(),
+}
+
+
+def serializer_for(file_path: str):
+    """ Serializer matching the extension of a file
+    """
+    for serializer in SERIALIZERS.values():
+        if file_path.endswith("." + serializer.EXTENSION):
+            return serializer
+    raise ValueError("unknown snapshot format: {}".format(file_path))
+
+
+def read(file_path: str) -> dict:
+    """ Read a snapshot file in the format of its extension
+    """
+    serializer = serializer_for(file_path)
+    with open(file_path, 'rb' if serializer.BINARY else 'r') as f:
+        return serializer.load(f)
+
+
+def write(file_path: str, objs_json: dict):
+    """ Write a snapshot file in the format of its extension
+    """
+    serializer = serializer_for(file_path)
+    with open(file_path, 'wb' if serializer.BINARY else 'w') as f:
+        serializer.dump(objs_json, f)
+
+
+def convert(source: str, destination: str):
+    """ Convert a snapshot file between formats
+    """
+    write(destination, read(source))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 -m models.serializers SOURCE DESTINATION")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+""" SQLite backend module: model storage in a SQLite database
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, TypeVar
+from models.backend import Backend
+from models.file_backend import FileBackend
+from models.index import matches, parse_query
+import json
+import sqlite3
+import threading
+
+
+CACHED_STATEMENTS = 256
+POOL_SIZE = 4
+BUSY_TIMEOUT = 30
+RANGE_OPERATORS = {"lt": "<", "le": "<=", "gt": ">", "ge": ">="}
+
+
+def _column_value(value):
+    """ Value stored in an indexed column: strings only, so that SQL
+    comparisons agree with Python ones (None otherwise)
+    """
+    return value if isinstance(value, str) else None
+
+
+def _query_value(value):
+    """ Column value to compare an attribute query value with
+    Return None if the value can't be compared in SQL
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return _column_value(value)
+
+
+class SQLiteBackend(Backend):
+    """ Objects stored as JSON documents, one table per class, with an
+    indexed column for each INDEXED_ATTRIBUTES and SORTED_ATTRIBUTES
+    attribute. Connections, in WAL mode, are shared by the threads
+    through a pool of up to POOL_SIZE idle ones, whose statement caches
+    keep the SQL of each class prepared. A thread keeps the same
+    connection for the whole of a transaction.
+    Unlike the file backend, get() and iter_search() build a new
+    instance from its row on every call: changes to an object only
+    reach the others once saved
+    """
+
+    def __init__(self, db_path: str):
+        """ Initialize the backend of a database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        """ New connection to the database, usable from any thread
+        """
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT,
+                               isolation_level=None,
+                               check_same_thread=False,
+                               cached_statements=CACHED_STATEMENTS)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """ Connection for the block: the one of the current thread's
+        transaction, or an idle one of the pool, given back after it
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+        with self._idle_lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        """ Give a connection back to the pool, rolled back if a
+        transaction was left open, or close it if the pool is full
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        with self._idle_lock:
+            if len(self._idle) < POOL_SIZE:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """ Close the idle connections of the pool
+        """
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    @staticmethod
+    def _columns(cls) -> tuple:
+        """ Attributes of a class stored in indexed columns
+        """
+        return tuple(attr for attr in dict.fromkeys(
+            cls.INDEXED_ATTRIBUTES + cls.SORTED_ATTRIBUTES) if attr != "id")
+
+    def _table(self, cls) -> dict:
+        """ SQL statements of a class
+        Its table, columns and indexes are created on first use
+        """
+        table = self._tables.get(cls.__name__)
+        if table is not None:
+            return table
+        with self._lock:
+            table = self._tables.get(cls.__name__)
+            if table is None:
+                table = self._create_table(cls)
+                self._tables[cls.__name__] = table
+        return table
+
+    def _create_table(self, cls) -> dict:
+        """ Create (or complete) the table of a class
+        Return its SQL statements
+        """
+        name = '"{}"'.format(cls.__name__)
+        columns = self._columns(cls)
+        quoted = ['"{}"'.format(column) for column in columns]
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY "
+                         "KEY, data TEXT NOT NULL)".format(name))
+            existing = {row[1] for row in
+                        conn.execute("PRAGMA table_info({})".format(name))}
+            for column, quoted_column in zip(columns, quoted):
+                if column not in existing:
+                    path = '$."{}"'.format(column)
+                    conn.execute("ALTER TABLE {} ADD COLUMN {} TEXT".format(
+                        name, quoted_column))
+                    conn.execute("UPDATE {} SET {} = CASE WHEN json_type("
+                                 "data, ?) = 'text' THEN json_extract(data, "
+                                 "?) END".format(name, quoted_column),
+                                 (path, path))
+                conn.execute('CREATE INDEX IF NOT EXISTS "{}_{}" ON {} ({})'
+                             .format(cls.__name__, column, name,
+                                     quoted_column))
+        updates = ", ".join(["data = excluded.data"] + [
+            "{0} = excluded.{0}".format(column) for column in quoted])
+        return {
+            "name": name,
+            "columns": columns,
+            "get": "SELECT data FROM {} WHERE id = ?".format(name),
+            "save": "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT(id) DO "
+                    "UPDATE SET {}".format(
+                        name, ", ".join(["id", "data"] + quoted),
+                        ", ".join("?" * (len(quoted) + 2)), updates),
+            "remove": "DELETE FROM {} WHERE id = ?".format(name),
+            "count": "SELECT COUNT(*) FROM {}".format(name),
+            "any": "SELECT 1 FROM {} LIMIT 1".format(name),
+            "select": "SELECT data FROM {}".format(name),
+        }
+
+    @staticmethod
+    def _row(table: dict, obj_json: dict) -> tuple:
+        """ Parameters of the save statement for a serialized object
+        """
+        return (obj_json["id"], json.dumps(obj_json)) + tuple(
+            _column_value(obj_json.get(column))
+            for column in table["columns"])
+
+    def load(self, cls):
+        """ Create the table of a class
+        An empty table is filled from the .db_<Class> files, if any
+        """
+        table = self._table(cls)
+        with self._connection() as conn:
+            if conn.execute(table["any"]).fetchone() is not None:
+                return
+        objs_json = FileBackend().read_files(cls)
+        if not objs_json:
+            return
+        with self.transaction(), self._connection() as conn:
+            conn.executemany(table["save"], (
+                self._row(table, cls(**obj_json).to_json(True))
+                for obj_json in objs_json.values()))
+
+    def get(self, cls, obj_id: str) -> TypeVar('Base'):
+        """ Object of a class by ID, or None
+        """
+        table = self._table(cls)
+        with self._connection() as conn:
+            row = conn.execute(table["get"], (obj_id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**json.loads(row[0]))
+
+    @staticmethod
+    def _where(table: dict, conditions: list) -> tuple:
+        """ SQL filter and parameters of the conditions on indexed
+        columns. It selects a superset of the matches: every condition
+        is checked again on the objects
+        """
+        clauses = []
+        params = []
+        for attr, op, value in conditions:
+            if attr not in table["columns"] and attr != "id":
+                continue
+            column = '"{}"'.format(attr)
+            if op == "in":
+                try:
+                    values = [_query_value(v) for v in value]
+                except TypeError:
+                    continue
+                if None in values:
+                    continue
+                clauses.append("{} IN ({})".format(
+                    column, ", ".join("?" * len(values))))
+                params.extend(values)
+                continue
+            value = _query_value(value)
+            if value is None:
+                continue
+            if op == "eq":
+                clauses.append("{} = ?".format(column))
+                params.append(value)
+            elif op in RANGE_OPERATORS:
+                clauses.append("{} {} ?".format(column,
+                                                RANGE_OPERATORS[op]))
+                params.append(value)
+            elif op == "prefix" and value:
+                clauses.append("{0} >= ? AND {0} < ?".format(column))
+                params.extend((value, value[:-1] + chr(ord(value[-1]) + 1)))
+        if not clauses:
+            return "", ()
+        return " WHERE " + " AND ".join(clauses), tuple(params)
+
+    def iter_search(self, cls,
+                    attributes: dict) -> Iterator[TypeVar('Base')]:
+        """ Generate the objects of a class matching attributes, in
+        insertion order. Conditions on indexed columns are evaluated by
+        SQLite, and rows are fetched as the generator is consumed
+        """
+        table = self._table(cls)
+        conditions = parse_query(attributes)
+        where, params = self._where(table, conditions)
+        with self._connection() as conn:
+            rows = conn.execute(
+                table["select"] + where + " ORDER BY rowid", params)
+            try:
+                for row in rows:
+                    obj = cls(**json.loads(row[0]))
+                    if all(matches(getattr(obj, attr, None), op, value)
+                           for attr, op, value in conditions):
+                        yield obj
+            finally:
+                rows.close()
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        table = self._table(obj.__class__)
+        with self._connection() as conn:
+            conn.execute(table["save"], self._row(table, obj.to_json(True)))
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        table = self._table(obj.__class__)
+        with self._connection() as conn:
+            conn.execute(table["remove"], (obj.id,))
+
+    def count(self, cls) -> int:
+        """ Number of objects of a class
+        """
+        table = self._table(cls)
+        with self._connection() as conn:
+            return conn.execute(table["count"]).fetchone()[0]
+
+    @contextmanager
+    def transaction(self):
+        """ Run the writes of the block, in the current thread, in one
+        SQLite transaction, committed even if the block raises like the
+        file backend does. Nested transactions join the outermost one
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield
+            return
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.conn = conn
+            try:
+                yield
+            finally:
+                self._local.conn = None
+                conn.execute("COMMIT")